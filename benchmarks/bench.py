@@ -0,0 +1,236 @@
+"""Headless benchmarks for farmasave.database and farmasave.calculations.
+
+Builds synthetic databases of increasing size, times every public function
+of the two modules against each one and records the peak Python memory of a
+single call. Results are written as JSON so runs can be compared.
+
+    python benchmarks/bench.py --sizes 10 1000 100000 --output bench.json
+
+Only the database and calculation modules are imported, never toga, so this
+runs anywhere a plain CPython is available.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    from farmasave import database, calculations, regimens
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+    from farmasave import database, calculations, regimens
+
+DEFAULT_SIZES = (10, 1000, 100000)
+MED_TYPES = ("Χάπι", "Κάψουλα", "Σιρόπι", "Σταγόνες", "Ένεση")
+BOX_SIZES = (10, 14, 20, 28, 30, 56, 60, 100)
+DOSAGES = (0, 1, 1, 1, 2, 2, 3, 4)
+
+
+def synthetic_medications(count, seed=0):
+    """Return `count` medications in the JSON import format."""
+    rnd = random.Random(seed)
+    items = []
+    for i in range(count):
+        pieces_per_box = rnd.choice(BOX_SIZES)
+        items.append({
+            'name': f"Φάρμακο {i:06d}",
+            'type': rnd.choice(MED_TYPES),
+            'pieces_per_box': pieces_per_box,
+            'current_boxes': rnd.randint(0, 5),
+            'current_pieces': rnd.randint(0, pieces_per_box - 1),
+            'dosage_per_day': rnd.choice(DOSAGES),
+        })
+    return items
+
+
+def build_database(data_dir, count, seed=0):
+    """Create a database in `data_dir` holding `count` synthetic medications.
+
+    Inventory dates are spread over the last 60 days so depletion days differ
+    the way they do in a real, incrementally maintained inventory.
+    """
+    database.set_db_path(data_dir)
+    database.create_tables()
+    database.import_data(synthetic_medications(count, seed), datetime.date.today())
+    rnd = random.Random(seed + 1)
+    today = datetime.date.today().toordinal()
+    with database.transaction() as conn:
+        days = [(today - rnd.randint(0, 60), med_id) for med_id in range(1, count + 1)]
+        conn.executemany("UPDATE medications SET inventory_day = ?, inventory_date = date(? + 1721424.5) WHERE id = ?",
+                         [(day, day, med_id) for day, med_id in days])
+        conn.executemany("UPDATE stock_ledger SET day = ? WHERE med_id = ?", days)
+
+
+def measure(func, setup=None, repeat=5):
+    """Time `func` `repeat` times, then trace one extra call for peak memory.
+
+    `setup` runs before every call and is not timed. Timing runs are not traced
+    because tracemalloc itself slows allocation-heavy code down considerably.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'calls': repeat,
+        'best_s': min(times),
+        'mean_s': sum(times) / len(times),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def _cold():
+    """Drop the cached snapshot and memoized results so the next call recomputes."""
+    calculations.clear_caches()
+
+
+def benchmarks(count, scratch_dir):
+    """Yield (name, func, setup) for every public function at this size."""
+    today = datetime.date.today()
+    day = today.toordinal()
+    sample_id = max(1, count // 2)
+    data = synthetic_medications(count, seed=2)
+    added = []
+
+    def add():
+        added.append(database.add_medication("Bench", "Χάπι", 30, 1, 0, 1))
+
+    def add_victim():
+        added.append(database.add_medication("Victim", "Χάπι", 30, 1, 0, 1))
+
+    def delete():
+        database.delete_medication(added.pop())
+
+    def import_scratch():
+        # Imports into a separate database so the main one keeps its spread of
+        # inventory dates for the calculation benchmarks below
+        with database.use_database(os.path.join(scratch_dir, 'medications.db')):
+            database.create_tables()
+            database.import_data(data, today)
+
+    # database.py
+    yield 'database.schema_version', database.schema_version, None
+    yield 'database.create_tables', database.create_tables, None
+    yield 'database.data_version', database.data_version, None
+    yield 'database.persistent_version', database.persistent_version, None
+    yield 'database.inventory_stamp', lambda: database.inventory_stamp(today), None
+    yield 'database.get_all_medications', database.get_all_medications, None
+    yield 'database.query_balances', lambda: database.query_balances(day), None
+    yield 'database.query_depleting', lambda: database.query_depleting(day), None
+    yield 'database.query_depleting[30d]', lambda: database.query_depleting(day, within_days=30), None
+    yield 'database.query_depleting[limit=1]', lambda: database.query_depleting(day, limit=1), None
+    yield 'database.iter_export_rows', lambda: sum(1 for _ in database.iter_export_rows()), None
+    yield 'database.export_data', database.export_data, None
+    yield 'database.add_medication', add, None
+    yield 'database.update_medication', lambda: database.update_medication(sample_id, "Bench", "Χάπι", 30, 2, 5, 2), None
+    yield 'database.update_stock', lambda: database.update_stock(sample_id, 3, 4), None
+    yield 'database.delete_medication', delete, add_victim
+    yield 'database.restock', lambda: database.restock(sample_id, 1, 0), None
+    yield 'database.consume', lambda: database.consume(sample_id, 1), None
+    yield 'database.query_balances_on[past]', lambda: database.query_balances_on(day - 30), None
+    yield 'database.query_balance_on', lambda: database.query_balance_on(sample_id, day - 30), None
+    yield 'database.query_ledger', lambda: database.query_ledger(sample_id), None
+    # Leaves one medication on an every-other-day regimen for the calculations below
+    yield 'database.set_regimens', lambda: database.set_regimens(sample_id, [regimens.parse('2+1/2', sample_id, day)]), None
+    yield 'database.query_regimens', database.query_regimens, None
+    yield 'database.import_data', import_scratch, None
+
+    # calculations.py, cold (snapshot rebuilt) and warm (snapshot reused)
+    yield 'calculations.get_inventory[cold]', calculations.get_inventory, _cold
+    yield 'calculations.get_inventory[warm]', calculations.get_inventory, None
+    yield 'calculations.get_depletion_info[cold]', calculations.get_depletion_info, _cold
+    yield 'calculations.get_depletion_info[warm]', calculations.get_depletion_info, None
+    yield 'calculations.next_depletion[cold]', calculations.next_depletion, _cold
+    yield 'calculations.running_out_within[cold]', lambda: calculations.running_out_within(7), _cold
+    yield 'calculations.balances_on[past]', lambda: calculations.balances_on(today - datetime.timedelta(days=30)), None
+    yield 'calculations.balances_on[future]', lambda: calculations.balances_on(today + datetime.timedelta(days=90)), None
+    yield 'calculations.stock_history', lambda: calculations.stock_history(sample_id, datetime.date.min, today), None
+    yield 'calculations.days_supplied', lambda: calculations.days_supplied(173, 3), None
+    for days in (30, 365, 1825):
+        yield f'calculations.schedule_intervals[{days}d]', lambda days=days: calculations.schedule_intervals(days), _cold
+        yield f'calculations.generate_schedule[{days}d]', lambda days=days: calculations.generate_schedule(days), _cold
+    for days in (30, 365):
+        end = today + datetime.timedelta(days=days - 1)
+        yield f'calculations.stock_curves[{days}d]', lambda end=end: calculations.stock_curves(today, end), _cold
+    five_years = today + datetime.timedelta(days=1825)
+    yield 'calculations.stock_curves[5y/30d]', lambda: calculations.stock_curves(today, five_years, step=30), _cold
+    for days in (90, 365):
+        yield f'calculations.plan_orders[{days}d]', lambda days=days: calculations.plan_orders(days), _cold
+    month_ago = today - datetime.timedelta(days=30)
+    yield 'calculations.stock_curves[past,100]', lambda: calculations.stock_curves(month_ago, today, limit=100), _cold
+    yield 'calculations.stock_curve[past]', lambda: calculations.stock_curve(sample_id, month_ago, five_years), _cold
+
+
+def run(sizes, repeat, workdir):
+    results = []
+    for count in sizes:
+        main_dir = os.path.join(workdir, f"bench_{count}")
+        scratch_dir = os.path.join(workdir, f"bench_{count}_import")
+        os.makedirs(main_dir, exist_ok=True)
+        os.makedirs(scratch_dir, exist_ok=True)
+        start = time.perf_counter()
+        build_database(main_dir, count)
+        print(f"{count} medications: database built in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+        for name, func, setup in benchmarks(count, scratch_dir):
+            result = measure(func, setup, repeat)
+            result.update(function=name, medications=count)
+            results.append(result)
+            print(f"  {name:45} best {result['best_s'] * 1000:10.3f} ms  peak {result['peak_kib']:10.1f} KiB", file=sys.stderr)
+
+        database.close_connections()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark farmasave database and calculations.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="medication counts to benchmark (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=5, help="timed calls per function (default: %(default)s)")
+    parser.add_argument('--output', default='bench_results.json', help="results file (default: %(default)s)")
+    parser.add_argument('--workdir', help="directory for the synthetic databases (default: a temp dir)")
+    parser.add_argument('--backend', choices=calculations.BACKENDS,
+                        help="forecasting backend (default: chosen per call)")
+    args = parser.parse_args(argv)
+    calculations.set_backend(args.backend)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run(args.sizes, args.repeat, args.workdir or tmp)
+
+    report = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'sqlite': sqlite3.sqlite_version,
+        'backend': calculations.BACKEND or 'auto',
+        'repeat': args.repeat,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    print(f"Wrote {len(results)} results to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,11 @@
-from .app import main
+import sys
 
 if __name__ == "__main__":
+    # `python -m farmasave <command>` runs the headless CLI without importing toga
+    if len(sys.argv) > 1:
+        from . import cli
+        if cli.wants_cli(sys.argv[1:]):
+            sys.exit(cli.main())
+
+    from .app import main
     main().main_loop()
@@ -3,9 +3,12 @@ from toga.style import Pack
 from toga.style.pack import COLUMN, ROW
 import os
 import json
-from datetime import datetime
+import logging
+from datetime import date, datetime
 import sys
 
+log = logging.getLogger(__name__)
+
 # Robust Java Access (Rubicon vs Chaquopy Native)
 AndroidJavaClass = None
 java_import_error = None
@@ -21,10 +24,10 @@ def get_android_class(class_name):
             from rubicon.java import JavaClass
             return JavaClass(class_name)
         except ImportError:
-            print(f"DEBUG: No Java bridge available for {class_name}")
+            log.debug("No Java bridge available for %s", class_name)
             return None
     except Exception as e:
-        print(f"DEBUG: Error loading class {class_name}: {e}")
+        log.error("Error loading class %s: %s", class_name, e)
         return None
 
 try:
@@ -34,6 +37,34 @@ except ImportError:
 
 from . import database
 from . import calculations
+from . import tables
+from . import worker
+from . import viewcache
+from . import diagnostics
+from . import regimens
+
+# Timed only while diagnostics are enabled (see diagnostics.py)
+diagnostics.instrument_module(database)
+diagnostics.instrument_module(calculations)
+
+# Schedule horizons offered in the "Ανάλωση" tab (label -> days)
+SCHEDULE_HORIZONS = {
+    "30 ημέρες": 30,
+    "90 ημέρες": 90,
+    "1 έτος": 365,
+    "5 έτη": 5 * 365,
+}
+
+# Rows exposed at a time by the schedule tables ("Περισσότερα" adds a page)
+SCHEDULE_PAGE_SIZE = 100
+
+def load_json_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def view_cache_key():
+    """Key of the warm-start view cache: schema, data revision and date"""
+    return database.persistent_version() + (date.today().isoformat(),)
 
 class Farmasave(toga.App):
     def on_exit(self, **kwargs):
@@ -49,6 +80,8 @@ class Farmasave(toga.App):
             return False
             
         # 3. Otherwise, allow exit
+        self.worker.shutdown()
+        database.close_connections()
         return True
 
     def show_view(self, content):
@@ -61,11 +94,11 @@ class Farmasave(toga.App):
         """Ask for storage permissions using Native Java via Rubicon/Chaquopy"""
         Python = get_android_class("com.chaquo.python.Python")
         if not Python:
-            print("DEBUG: Java bridge not available, skipping permission request")
+            log.warning("Java bridge not available, skipping permission request")
             return
             
         try:
-            print("DEBUG: Attempting Native Java Permission Request...")
+            log.debug("Attempting Native Java Permission Request...")
             
             # Get context
             context = Python.getPlatform().getApplication()
@@ -73,7 +106,7 @@ class Farmasave(toga.App):
             # Check Android version first
             Build = get_android_class("android.os.Build")
             sdk_int = Build.VERSION.SDK_INT
-            print(f"DEBUG: Android SDK version: {sdk_int}")
+            log.debug("Android SDK version: %s", sdk_int)
             
             if sdk_int >= 30:  # Android 11+ (R)
                 # For Android 11+, we need MANAGE_EXTERNAL_STORAGE
@@ -81,7 +114,7 @@ class Farmasave(toga.App):
                 is_manager = Environment.isExternalStorageManager()
                 
                 if not is_manager:
-                    print("DEBUG: Need MANAGE_EXTERNAL_STORAGE, launching settings...")
+                    log.debug("Need MANAGE_EXTERNAL_STORAGE, launching settings...")
                     Settings = get_android_class("android.provider.Settings")
                     Uri = get_android_class("android.net.Uri")
                     Intent = get_android_class("android.content.Intent")
@@ -96,7 +129,7 @@ class Farmasave(toga.App):
                     
                     context.startActivity(intent)
                 else:
-                    print("DEBUG: MANAGE_EXTERNAL_STORAGE already granted.")
+                    log.debug("MANAGE_EXTERNAL_STORAGE already granted.")
             else:
                 # For Android 10 and below, use ActivityCompat
                 # Try to get Activity for permission request
@@ -120,22 +153,22 @@ class Farmasave(toga.App):
                                 missing_perms.append(p)
                         
                         if missing_perms:
-                            print(f"DEBUG: Missing permissions: {missing_perms}. Requesting now...")
+                            log.debug("Missing permissions: %s. Requesting now...", missing_perms)
                             ActivityCompat.requestPermissions(activity, missing_perms, 1001)
                         else:
-                            print("DEBUG: All permissions already granted.")
+                            log.debug("All permissions already granted.")
                     else:
-                        print("DEBUG: Could not load all required classes for permission check")
+                        log.warning("Could not load all required classes for permission check")
                         # Fallback to Toga permissions
                         if toga_request_permissions:
                             toga_request_permissions(["android.permission.READ_EXTERNAL_STORAGE", "android.permission.WRITE_EXTERNAL_STORAGE"])
                 except Exception as e:
-                    print(f"DEBUG: ActivityCompat failed: {e}, trying Toga fallback")
+                    log.warning("ActivityCompat failed: %s, trying Toga fallback", e)
                     if toga_request_permissions:
                         toga_request_permissions(["android.permission.READ_EXTERNAL_STORAGE", "android.permission.WRITE_EXTERNAL_STORAGE"])
                     
         except Exception as e:
-            print(f"DEBUG: Native Permission Request failed: {e}")
+            log.error("Native Permission Request failed: %s", e)
 
 
     def request_android_permissions_manual(self, widget):
@@ -194,34 +227,22 @@ class Farmasave(toga.App):
 
     def python_on_activity_result(self, requestCode, resultCode, data):
         """Native callback from MainActivity.java"""
-        print(f"DEBUG: python_on_activity_result hit! req={requestCode}, res={resultCode}")
+        log.debug("python_on_activity_result hit! req=%s, res=%s", requestCode, resultCode)
         
         if requestCode == 1001 and resultCode == -1: # Import
-            print("DEBUG: Import Result OK")
+            log.debug("Import Result OK")
             uri = data.getData()
             self.add_background_task(lambda app: self._handle_import_uri(uri))
             
         elif requestCode == 1002 and resultCode == -1: # Export
-            print("DEBUG: Export Result OK")
+            log.debug("Export Result OK")
             uri = data.getData()
             self.add_background_task(lambda app: self._handle_export_uri(uri))
             
     async def _handle_import_uri(self, uri):
         try:
-            print(f"DEBUG: Handling Import URI: {uri}")
-            activity = self._get_activity()
-            content_resolver = activity.getContentResolver()
-            
-            # Read content from URI
-            input_stream = content_resolver.openInputStream(uri)
-            # Read into byte array buffer
-            scanner = get_android_class("java.util.Scanner")(input_stream).useDelimiter("\\A")
-            json_str = ""
-            if scanner.hasNext():
-                json_str = scanner.next()
-            input_stream.close()
-            
-            data = json.loads(json_str)
+            log.debug("Handling Import URI: %s", uri)
+            data = await self.worker.read(self._read_import_uri, uri)
             
             # Ask for confirmation (Async dialog needs to be awaited)
             # Since we are in a background task lambda, we can await
@@ -231,19 +252,17 @@ class Farmasave(toga.App):
             ))
             
             if confirm:
-                database.import_data(data, datetime.now().date())
-                self.refresh_medications()
-                self.refresh_stock()
-                self.refresh_schedule()
+                await self.worker.write(database.import_data, data, datetime.now().date(), progress=self.worker.on_loop(self.report_import_progress))
+                await self.refresh_all()
                 await self.main_window.dialog(toga.InfoDialog("Επιτυχία", "Η εισαγωγή ολοκληρώθηκε!"))
                 
         except Exception as e:
-            print(f"DEBUG: Import Error: {e}")
+            log.error("Import Error: %s", e)
             await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", f"{e}"))
 
     def python_on_request_permissions_result(self, requestCode, permissions, grantResults):
         """Native callback for permissions"""
-        print(f"DEBUG: Permissions Result: req={requestCode}, grants={grantResults}")
+        log.debug("Permissions Result: req=%s, grants=%s", requestCode, grantResults)
         if requestCode == 100:
             # We can inspect grantResults here if we want to confirm
             pass
@@ -254,6 +273,13 @@ class Farmasave(toga.App):
         # Database initialization
         database.set_db_path(self.paths.data)
         database.create_tables()
+        # Database and calculation calls run here, off the UI event loop
+        self.worker = worker.DataWorker()
+        
+        # Rows rendered at the last run, shown until the database has been checked
+        self._view_key, self._views = viewcache.load(self.paths.data)
+        if self._view_key is None or self._view_key[-1] != date.today().isoformat():
+            self._views = {}
 
         # Custom Greek menu groups
         ARXEIO_GROUP = toga.Group("Αρχείο", order=0)
@@ -264,11 +290,11 @@ class Farmasave(toga.App):
         # Standard Toga handlers are automatically async-aware
         # Wrapper functions for async handlers
         async def do_import(widget):
-            print("DEBUG: Import command triggered from menu")
+            log.debug("Import command triggered from menu")
             await self.trigger_import_logic()
         
         async def do_export(widget):
-            print("DEBUG: Export command triggered from menu")
+            log.debug("Export command triggered from menu")
             await self.trigger_export_logic()
 
         # Commands for the menu
@@ -313,34 +339,58 @@ class Farmasave(toga.App):
             style=Pack(flex=1, color="turquoise")
         )
         
+        # Only the first tab is built now; the others start as empty boxes
+        # and get their content the first time they are selected
+        self._tab_builders = [
+            self.create_medications_tab,
+            self.create_schedule_tab,
+            self.create_stock_tab,
+            self.create_io_tab,
+        ]
+        # Method names rather than bound methods: they are looked up on each
+        # call, so the timing wrappers diagnostics.enable() installs later apply
+        self._tab_refreshers = {
+            0: 'refresh_medications',
+            1: 'refresh_schedule',
+            2: 'refresh_stock',
+        }
+        self._built_tabs = set()
+        # Widgets of the I/O tab, used by import/export before it is built
+        self.compact_export = None
+        self.import_progress = None
+        
         # Tab 1: Φάρμακα (Medications)
-        self.med_box = self.create_medications_tab()
+        self.med_box = toga.Box(style=Pack(direction=COLUMN, flex=1))
         self.tabs.content.append("Φάρμακα", self.med_box)
-
-        # Version label footer
-        self.med_box.add(toga.Label("v2.7.0 (Unified)", style=Pack(font_size=8, text_align='right', padding=5)))
         
         # Tab 2: Ανάλωση (Schedule/Consumption)
-        self.schedule_box = self.create_schedule_tab()
+        self.schedule_box = toga.Box(style=Pack(direction=COLUMN, flex=1))
         self.tabs.content.append("Ανάλωση", self.schedule_box)
         
         # Tab 3: Απόθεμα (Stock)
-        self.stock_box = self.create_stock_tab()
+        self.stock_box = toga.Box(style=Pack(direction=COLUMN, flex=1))
         self.tabs.content.append("Απόθεμα", self.stock_box)
         
         # Tab 4: I/O (Export/Import)
-        self.io_box = self.create_io_tab()
+        self.io_box = toga.Box(style=Pack(direction=COLUMN, flex=1))
         self.tabs.content.append("I/O", self.io_box)
         
+        self._tab_boxes = [self.med_box, self.schedule_box, self.stock_box, self.io_box]
+        self.ensure_tab(0)
+
+        # Version label footer
+        self.med_box.add(toga.Label("v2.7.0 (Unified)", style=Pack(font_size=8, text_align='right', padding=5)))
+        
         self.main_window.content = self.tabs
         self.main_window.show()
 
         # POST-SHOW SETUP
         async def initial_setup(app):
-            print("DEBUG: initial_setup background task started")
+            log.debug("initial_setup background task started")
+            # The warm-start rows stay only if nothing was written since
+            if 'medications' not in self._views or await self.worker.read(view_cache_key) != self._view_key:
+                await self.refresh_medications()
             if self.is_android():
-                # Visual confirmation
-                await self.main_window.dialog(toga.InfoDialog("Farmasave v2.7.0", "Η εφαρμογή ξεκίνησε!"))
                 self.request_android_permissions()
 
         self.add_background_task(initial_setup)
@@ -362,14 +412,53 @@ class Farmasave(toga.App):
         target_tab = self.tabs.content[index]
         self.tabs.current_tab = target_tab
 
-    def handle_tab_change(self, widget, **kwargs):
+    def ensure_tab(self, index):
+        """Build a tab's content the first time it is needed"""
+        if index in self._built_tabs:
+            return
+        self._built_tabs.add(index)
+        content = self._tab_builders[index]()
+        content.style.flex = 1
+        self._tab_boxes[index].add(content)
+        
+        # Show the last run's rows until the first refresh replaces them
+        if index == 0 and 'medications' in self._views:
+            tables.sync_rows(self.med_table.data, self.med_table.accessors, self._views['medications'])
+        elif index == 1 and 'depletion' in self._views:
+            self.depletion_table.data = self._views['depletion']
+        elif index == 2 and 'stock' in self._views:
+            tables.sync_rows(self.stock_table.data, self.stock_table.accessors, self._views['stock'])
+
+    async def remember_view(self, name, rows):
+        """Keep rendered rows for the next launch (see viewcache)"""
+        rows = [list(row) for row in rows]
+        key = await self.worker.read(view_cache_key)
+        if key != self._view_key:
+            # Rows of the other views were rendered from older data
+            self._view_key, self._views = key, {}
+        elif self._views.get(name) == rows:
+            return
+        self._views[name] = rows
+        # On the single writer thread, so saves land in the order they were made
+        await self.worker.write(viewcache.save, self.paths.data, self._view_key, dict(self._views))
+
+    async def handle_tab_change(self, widget, **kwargs):
         index = widget.current_tab.index
-        if index == 0:
-            self.refresh_medications()
-        elif index == 1:
-            self.refresh_schedule()
-        elif index == 2:
-            self.refresh_stock()
+        self.ensure_tab(index)
+        if index in self._tab_refreshers:
+            await getattr(self, self._tab_refreshers[index])()
+
+    def late_handler(self, name):
+        """Widget handler calling the method `name`, looked up at call time (see _tab_refreshers)"""
+        async def handler(widget, **kwargs):
+            await getattr(self, name)(widget)
+        return handler
+
+    async def refresh_all(self):
+        """Refresh every data view that has been built, after a bulk change such as an import"""
+        for index, name in self._tab_refreshers.items():
+            if index in self._built_tabs:
+                await getattr(self, name)()
 
     def create_medications_tab(self):
         self.med_table = toga.Table(
@@ -380,7 +469,7 @@ class Farmasave(toga.App):
         )
         
         add_btn = toga.Button("Προσθήκη", on_press=self.handle_add_med, style=Pack(margin=5))
-        refresh_btn = toga.Button("Ανανέωση", on_press=self.refresh_medications, style=Pack(margin=5))
+        refresh_btn = toga.Button("Ανανέωση", on_press=self.late_handler('refresh_medications'), style=Pack(margin=5))
         
         btn_box = toga.Box(children=[add_btn, refresh_btn], style=Pack(direction=ROW))
         
@@ -388,66 +477,105 @@ class Farmasave(toga.App):
             children=[btn_box, self.med_table],
             style=Pack(direction=COLUMN, margin=10)
         )
-        self.refresh_medications()
         return container
 
-    def refresh_medications(self, widget=None):
-        self.med_table.data.clear()
-        meds = database.get_all_medications()
-        now = datetime.now().date()
-        
-        for med in meds:
-            id, name, type, ppb, boxes, pieces, dosage, inv_date_str = med
-            initial_total = (boxes * ppb) + pieces
-            dosage = dosage if dosage is not None else 0
-            
-            if inv_date_str:
-                inv_date = datetime.strptime(inv_date_str, "%Y-%m-%d").date()
-                days_passed = (now - inv_date).days
-                consumed = days_passed * dosage
-                live_balance = max(0, initial_total - consumed)
-            else:
-                live_balance = initial_total
-                inv_date_str = "-"
-            
-            self.med_table.data.append(
-                (str(id), str(name), str(type), str(ppb), str(boxes), str(pieces), 
-                 str(initial_total), str(int(live_balance)), str(dosage), str(inv_date_str))
-            )
+    async def refresh_medications(self, widget=None):
+        inventory = await self.worker.read(calculations.get_inventory)
+        rows = [
+            (str(med.id), str(med.name), str(med.type), str(med.pieces_per_box), str(med.current_boxes), str(med.current_pieces), 
+             str(med.total_pieces), str(int(med.balance)), str(med.dosage), str(med.inventory_date or "-"))
+            for med in inventory.items
+        ]
+        tables.sync_rows(self.med_table.data, self.med_table.accessors, rows)
+        await self.remember_view('medications', rows)
 
     def create_schedule_tab(self):
-        self.schedule_content = toga.Box(style=Pack(direction=COLUMN, margin=5))
-        self.schedule_scroll = toga.ScrollContainer(content=self.schedule_content, style=Pack(flex=1))
+        # Both lists are native tables fed by lazy sources, so the widget
+        # count no longer grows with the number of entries or the horizon.
+        self.depletion_label = toga.Label("--- Ημερομηνίες Εξάντλησης ---", style=Pack(font_weight='bold', margin_bottom=5))
+        self.depletion_table = toga.Table(
+            headings=["Ημερομηνία", "Όνομα", "Υπόλοιπο", "Ημέρες"],
+            accessors=["date", "name", "stock", "days"],
+            style=Pack(flex=1)
+        )
+        self.schedule_label = toga.Label("--- Ημερήσιο Πρόγραμμα ---", style=Pack(font_weight='bold', margin_top=10, margin_bottom=5))
+        self.schedule_table = toga.Table(
+            headings=["Ημέρες", "Φάρμακα"],
+            accessors=["period", "meds"],
+            style=Pack(flex=1)
+        )
+        self._schedule_key = None
+        self.schedule_more_btn = toga.Button("Περισσότερα", on_press=self.show_more_schedule, enabled=False, style=Pack(margin=5))
         
-        refresh_btn = toga.Button("Ανανέωση", on_press=self.refresh_schedule, style=Pack(margin=5))
+        refresh_btn = toga.Button("Ανανέωση", on_press=self.late_handler('refresh_schedule'), style=Pack(margin=5))
+        self.schedule_horizon = toga.Selection(
+            items=list(SCHEDULE_HORIZONS),
+            on_change=self.late_handler('refresh_schedule'),
+            style=Pack(margin=5)
+        )
         
         container = toga.Box(
-            children=[refresh_btn, self.schedule_scroll],
+            children=[
+                toga.Box(children=[refresh_btn, self.schedule_horizon], style=Pack(direction=ROW)),
+                self.depletion_label,
+                self.depletion_table,
+                self.schedule_label,
+                self.schedule_table,
+                self.schedule_more_btn,
+            ],
             style=Pack(direction=COLUMN, margin=10)
         )
-        self.refresh_schedule()
         return container
 
-    def refresh_schedule(self, widget=None):
-        self.schedule_content.clear()
-        earliest, depletion_list = calculations.get_depletion_info()
+    async def refresh_schedule(self, widget=None):
+        horizon = self.schedule_horizon.value or next(iter(SCHEDULE_HORIZONS))
+        days_ahead = SCHEDULE_HORIZONS[horizon]
         
-        self.schedule_content.add(toga.Label("--- Ημερομηνίες Εξάντλησης ---", style=Pack(font_weight='bold', padding_bottom=5)))
+        # Tab switches land here too; skip the rebuild when nothing changed
+        key = (await self.worker.read(database.persistent_version), datetime.now().date(), horizon)
+        if key == self._schedule_key:
+            return
+        self._schedule_key = key
         
+        def compute():
+            earliest, depletion_list = calculations.get_depletion_info()
+            return depletion_list, calculations.schedule_intervals(days_ahead)
+        depletion_list, intervals = await self.worker.read(compute)
         if depletion_list:
-            for name, date, days, stock in depletion_list:
-                line = f"{date}: {name} (Υπόλοιπο: {stock:.0f}, σε {days:.1f} ημέρες)"
-                self.schedule_content.add(toga.Label(line, style=Pack(padding_bottom=2)))
+            self.depletion_label.text = "--- Ημερομηνίες Εξάντλησης ---"
         else:
-            self.schedule_content.add(toga.Label("Δεν υπάρχουν επαρκείς πληροφορίες."))
-            
-        self.schedule_content.add(toga.Divider(style=Pack(padding_top=10, padding_bottom=10)))
-        self.schedule_content.add(toga.Label("--- Ημερήσιο Πρόγραμμα (30 ημέρες) ---", style=Pack(font_weight='bold', padding_bottom=5)))
+            self.depletion_label.text = "Δεν υπάρχουν επαρκείς πληροφορίες."
+        self.depletion_table.data = tables.LazyListSource(
+            self.depletion_table.accessors,
+            depletion_list,
+            lambda entry: (str(entry[1]), entry[0], f"{entry[3]:.0f}", f"{entry[2]:.1f}"),
+            limit=SCHEDULE_PAGE_SIZE,
+        )
+        depletion_source = self.depletion_table.data
+        await self.remember_view('depletion', [depletion_source[i] for i in range(len(depletion_source))])
+        
+        def format_interval(interval):
+            first_date, last_date, meds = interval
+            period = f"{first_date}" if first_date == last_date else f"{first_date} – {last_date}"
+            return period, ", ".join(meds)
         
-        schedule = calculations.generate_schedule()
-        for date, meds in schedule:
-            line = f"{date}: {', '.join(meds)}"
-            self.schedule_content.add(toga.Label(line, style=Pack(padding_bottom=2)))
+        # One row per run of days with the same medications
+        self.schedule_label.text = f"--- Ημερήσιο Πρόγραμμα ({horizon}) ---"
+        self.schedule_table.data = tables.LazyListSource(
+            self.schedule_table.accessors,
+            intervals,
+            format_interval,
+            limit=SCHEDULE_PAGE_SIZE,
+        )
+        self.schedule_more_btn.enabled = self.depletion_table.data.truncated or self.schedule_table.data.truncated
+
+    def show_more_schedule(self, widget):
+        """Grow the visible window of both schedule lists by one page"""
+        if self.depletion_table.data.truncated:
+            self.depletion_table.data = self.depletion_table.data.more()
+        if self.schedule_table.data.truncated:
+            self.schedule_table.data = self.schedule_table.data.more()
+        self.schedule_more_btn.enabled = self.depletion_table.data.truncated or self.schedule_table.data.truncated
 
     def create_stock_tab(self):
         self.stock_table = toga.Table(
@@ -457,70 +585,55 @@ class Farmasave(toga.App):
             style=Pack(flex=1)
         )
         
-        refresh_btn = toga.Button("Ανανέωση", on_press=self.refresh_stock, style=Pack(margin=5))
+        refresh_btn = toga.Button("Ανανέωση", on_press=self.late_handler('refresh_stock'), style=Pack(margin=5))
         
         container = toga.Box(
             children=[refresh_btn, self.stock_table],
             style=Pack(direction=COLUMN, margin=10)
         )
-        self.refresh_stock()
         return container
 
-    def refresh_stock(self, widget=None):
-        self.stock_table.data.clear()
-        meds = database.get_all_medications()
-        now = datetime.now().date()
-        
-        for med in meds:
-            id, name, type, ppb, boxes, pieces, dosage, inv_date_str = med
-            initial_total = (boxes * ppb) + pieces
-            dosage = dosage if dosage is not None else 0
-            
-            if inv_date_str:
-                inv_date = datetime.strptime(inv_date_str, "%Y-%m-%d").date()
-                days_passed = (now - inv_date).days
-                consumed = days_passed * dosage
-                live_balance = max(0, initial_total - consumed)
-            else:
-                live_balance = initial_total
-                inv_date_str = "-"
-            
-            self.stock_table.data.append(
-                (str(id), str(name), str(boxes), str(pieces), str(int(live_balance)), str(initial_total), str(inv_date_str))
-            )
+    async def refresh_stock(self, widget=None):
+        inventory = await self.worker.read(calculations.get_inventory)
+        rows = [
+            (str(med.id), str(med.name), str(med.current_boxes), str(med.current_pieces), str(int(med.balance)), str(med.total_pieces), str(med.inventory_date or "-"))
+            for med in inventory.items
+        ]
+        tables.sync_rows(self.stock_table.data, self.stock_table.accessors, rows)
+        await self.remember_view('stock', rows)
 
     def onActivityResult(self, requestCode, resultCode, data):
         """Native Android callback for activity results (called by MainActivity)"""
-        print(f"DEBUG: onActivityResult sync start: {requestCode}")
+        log.debug("onActivityResult sync start: %s", requestCode)
         # Delegate to async handler
         self.add_background_task(lambda app: self._async_onActivityResult(requestCode, resultCode, data))
 
     async def _async_onActivityResult(self, requestCode, resultCode, data):
         """Async handler for activity results"""
-        print(f"DEBUG: _async_onActivityResult start: {requestCode}")
+        log.debug("_async_onActivityResult start: %s", requestCode)
         
         # PROVIDE VISUAL FEEDBACK
         await self.main_window.dialog(toga.InfoDialog("DEBUG", f"Data received! code={requestCode}"))
         
         # RESULT_OK is -1
         if resultCode != -1:
-            print("DEBUG: Result not OK, ignoring.")
+            log.debug("Result not OK, ignoring.")
             return
 
         if data is None:
-            print("DEBUG: Data is None, ignoring.")
+            log.debug("Data is None, ignoring.")
             return
 
         uri = data.getData()
         if uri is None:
-            print("DEBUG: URI is None, ignoring.")
+            log.debug("URI is None, ignoring.")
             return
 
         if requestCode == 1001:  # IMPORT
-            print(f"DEBUG: Import URI received: {uri}")
+            log.debug("Import URI received: %s", uri)
             await self._handle_import_uri(uri)
         elif requestCode == 1002:  # EXPORT
-            print(f"DEBUG: Export URI received: {uri}")
+            log.debug("Export URI received: %s", uri)
             await self._handle_export_uri(uri)
 
     def _get_activity(self):
@@ -528,28 +641,27 @@ class Farmasave(toga.App):
         try:
             return get_android_class("org.beeware.android.MainActivity").singletonThis
         except Exception as e:
-            print(f"DEBUG: Failed to get activity: {e}")
+            log.error("Failed to get activity: %s", e)
             return None
 
+    def _read_import_uri(self, uri):
+        """Stream and decode the JSON export behind a content URI"""
+        from . import jsonstream
+        
+        activity = self._get_activity()
+        if not activity:
+            raise Exception("MainActivity not available")
+        content_resolver = activity.getContentResolver()
+        input_stream = content_resolver.openInputStream(uri)
+        try:
+            return list(jsonstream.iter_json_array(jsonstream.iter_java_chunks(input_stream)))
+        finally:
+            input_stream.close()
+
     async def _handle_import_uri(self, uri):
         """Read data from the selected URI for import"""
         try:
-            activity = self._get_activity()
-            if not activity:
-                raise Exception("MainActivity not available")
-            content_resolver = activity.getContentResolver()
-            input_stream = content_resolver.openInputStream(uri)
-            
-            # Read bytes from stream
-            bytes_data = []
-            while True:
-                b = input_stream.read()
-                if b == -1: break
-                bytes_data.append(b)
-            input_stream.close()
-            
-            content_str = bytes(bytes_data).decode('utf-8')
-            data = json.loads(content_str)
+            data = await self.worker.read(self._read_import_uri, uri)
             
             # Now show date dialog or proceed directly
             selected_date = datetime.now().strftime("%Y-%m-%d")
@@ -559,26 +671,17 @@ class Farmasave(toga.App):
             ))
             
             if confirm:
-                database.import_data(data, selected_date)
-                self.refresh_medications()
-                self.refresh_stock()
-                self.refresh_schedule()
+                await self.worker.write(database.import_data, data, selected_date, progress=self.worker.on_loop(self.report_import_progress))
+                await self.refresh_all()
                 await self.main_window.dialog(toga.InfoDialog("Επιτυχία", "Η εισαγωγή ολοκληρώθηκε!"))
         except Exception as e:
-            print(f"DEBUG: Import Error: {e}")
+            log.error("Import Error: %s", e)
             await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", f"Αποτυχία εισαγωγής:\n{e}"))
 
     async def _handle_export_uri(self, uri):
         """Write data to the selected URI for export on Android"""
         try:
-            print(f"DEBUG: _handle_export_uri started for {uri}")
-            data = database.export_data()
-            print(f"DEBUG: Export data collected: {len(data)} items")
-            
-            content_str = json.dumps(data, ensure_ascii=False, indent=4)
-            data_bytes = content_str.encode('utf-8')
-            print(f"DEBUG: JSON byte length: {len(data_bytes)}")
-            
+            log.debug("_handle_export_uri started for %s", uri)
             activity = self._get_activity()
             if not activity:
                 raise Exception("MainActivity not available")
@@ -589,28 +692,37 @@ class Farmasave(toga.App):
             if output_stream is None:
                 raise Exception("Could not open output stream")
                 
-            output_stream.write(data_bytes)
-            output_stream.flush()
-            output_stream.close()
+            try:
+                count = await self.write_export(output_stream.write)
+                output_stream.flush()
+            finally:
+                output_stream.close()
             
-            print("DEBUG: Export successful")
-            await self.main_window.dialog(toga.InfoDialog("Επιτυχία", f"Η εξαγωγή ολοκληρώθηκε!\n({len(data)} φάρμακα)"))
+            log.debug("Export successful: %s items", count)
+            await self.main_window.dialog(toga.InfoDialog("Επιτυχία", f"Η εξαγωγή ολοκληρώθηκε!\n({count} φάρμακα)"))
         except Exception as e:
-            print(f"DEBUG: Export Error: {e}")
+            log.error("Export Error: %s", e)
             await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", f"Αποτυχία εξαγωγής:\n{e}"))
 
+    async def write_export(self, write):
+        """Stream the JSON export through write(bytes) on a worker thread; returns the item count"""
+        from . import jsonstream
+        
+        indent = None if self.compact_export is not None and self.compact_export.value else 4
+        return await self.worker.read(jsonstream.write_json_array, database.iter_export_rows(), write, indent=indent)
+
     def is_android(self):
         """Check if running on Android using sys.platform"""
         return sys.platform == "android"
 
     async def trigger_export_logic(self):
         """Unified export logic for all platforms"""
-        print("DEBUG: trigger_export_logic called")
+        log.debug("trigger_export_logic called")
         suggested_name = f"meds_{datetime.now().strftime('%Y%m%d_%H%M')}.json"
         
         if self.is_android():
             try:
-                print("DEBUG: Triggering Android Export Intent")
+                log.debug("Triggering Android Export Intent")
                 Intent = get_android_class("android.content.Intent")
                 intent = Intent(Intent.ACTION_CREATE_DOCUMENT)
                 intent.addCategory(Intent.CATEGORY_OPENABLE)
@@ -619,41 +731,40 @@ class Farmasave(toga.App):
                 
                 activity = self._get_activity()
                 if not activity:
-                    print("DEBUG: MainActivity not available")
+                    log.warning("MainActivity not available")
                     await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", "Το Android Activity δεν βρέθηκε."))
                     return
-                print("DEBUG: Launching Intent...")
+                log.debug("Launching Intent...")
                 activity.startActivityForResult(intent, 1002)
-                print("DEBUG: Intent launched successfully")
+                log.debug("Intent launched successfully")
             except Exception as ex:
-                print(f"DEBUG: Android Export triggering error: {ex}")
+                log.error("Android Export triggering error: %s", ex)
                 await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", f"Αποτυχία εκκίνησης Intent: {ex}"))
         else:
             # Desktop
-            print("DEBUG: Triggering Toga Desktop Export Dialog")
+            log.debug("Triggering Toga Desktop Export Dialog")
             dialog = toga.SaveFileDialog(
                 title="Εξαγωγή Δεδομένων",
                 suggested_filename=suggested_name,
                 file_types=['json'],
             )
             path = await self.main_window.dialog(dialog)
-            print(f"DEBUG: Desktop Export Path: {path}")
+            log.debug("Desktop Export Path: %s", path)
             if path:
                 try:
-                    data = database.export_data()
-                    with open(str(path), 'w', encoding='utf-8') as f:
-                        json.dump(data, f, ensure_ascii=False, indent=4)
+                    with open(str(path), 'wb') as f:
+                        await self.write_export(f.write)
                     await self.main_window.dialog(toga.InfoDialog("Επιτυχία", "Η εξαγωγή JSON ολοκληρώθηκε!"))
                 except Exception as ex:
-                    print(f"DEBUG: Desktop Export Error: {ex}")
+                    log.error("Desktop Export Error: %s", ex)
                     await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", f"Αποτυχία: {ex}"))
 
     async def trigger_import_logic(self):
         """Unified import logic for all platforms"""
-        print("DEBUG: trigger_import_logic called")
+        log.debug("trigger_import_logic called")
         if self.is_android():
             try:
-                print("DEBUG: Triggering Android Import Intent")
+                log.debug("Triggering Android Import Intent")
                 Intent = get_android_class("android.content.Intent")
                 intent = Intent(Intent.ACTION_OPEN_DOCUMENT)
                 intent.addCategory(Intent.CATEGORY_OPENABLE)
@@ -661,36 +772,36 @@ class Farmasave(toga.App):
                 
                 activity = self._get_activity()
                 if not activity:
-                    print("DEBUG: MainActivity not available")
+                    log.warning("MainActivity not available")
                     await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", "Το Android Activity δεν βρέθηκε."))
                     return
-                print("DEBUG: Launching Intent...")
+                log.debug("Launching Intent...")
                 activity.startActivityForResult(intent, 1001)
-                print("DEBUG: Intent launched successfully")
+                log.debug("Intent launched successfully")
             except Exception as ex:
-                print(f"DEBUG: Android Import triggering error: {ex}")
+                log.error("Android Import triggering error: %s", ex)
                 await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", f"Αποτυχία εκκίνησης Intent: {ex}"))
         else:
             # Desktop
-            print("DEBUG: Triggering Toga Desktop Import Dialog")
+            log.debug("Triggering Toga Desktop Import Dialog")
             dialog = toga.OpenFileDialog(
                 title="Εισαγωγή Δεδομένων",
                 multiple_select=False,
                 file_types=['json'],
             )
             path = await self.main_window.dialog(dialog)
-            print(f"DEBUG: Desktop Import Path: {path}")
+            log.debug("Desktop Import Path: %s", path)
             if path:
                 await self.open_date_selection_dialog(path)
 
     def create_io_tab(self):
         """Build the data management tab"""
         async def handle_export_btn(widget):
-            print("DEBUG: Export button clicked in I/O tab")
+            log.debug("Export button clicked in I/O tab")
             await self.trigger_export_logic()
 
         async def handle_import_btn(widget):
-            print("DEBUG: Import button clicked in I/O tab")
+            log.debug("Import button clicked in I/O tab")
             await self.trigger_import_logic()
 
         async def check_java_bridge(widget):
@@ -728,6 +839,23 @@ class Farmasave(toga.App):
             style=Pack(margin=5, background_color="orange", color="white")
         )
         
+        self.import_progress = toga.ProgressBar(max=1.0, style=Pack(margin=5))
+        self.compact_export = toga.Switch("Συμπαγές JSON (χωρίς εσοχές)", style=Pack(margin=5))
+
+        def toggle_diagnostics(widget):
+            if widget.value:
+                diagnostics.enable()
+            else:
+                diagnostics.disable()
+
+        diagnostics_switch = toga.Switch(
+            "Μέτρηση χρόνων (διαγνωστικά)",
+            value=diagnostics.is_enabled(),
+            on_change=toggle_diagnostics,
+            style=Pack(margin=5)
+        )
+        diagnostics_btn = toga.Button("Διαγνωστικά", on_press=self.show_diagnostics, style=Pack(margin=5))
+        
         container = toga.Box(
             children=[
                 toga.Label("Διαχείριση Δεδομένων", style=Pack(font_weight='bold', font_size=15, margin_bottom=20)),
@@ -735,7 +863,12 @@ class Farmasave(toga.App):
                 perm_btn,
                 toga.Box(style=Pack(height=10)),
                 export_btn,
+                self.compact_export,
                 import_btn,
+                self.import_progress,
+                toga.Box(style=Pack(height=10)),
+                diagnostics_switch,
+                diagnostics_btn,
                 toga.Box(style=Pack(height=20)),
                 toga.Label("Cross-platform Import/Export (v2.7.0)", 
                           style=Pack(font_size=10, text_align='center'))
@@ -744,6 +877,45 @@ class Farmasave(toga.App):
         )
         return container
 
+    def show_diagnostics(self, widget=None):
+        """Call counts and latencies recorded by diagnostics, with JSON export"""
+        report = toga.MultilineTextInput(value=diagnostics.report(), readonly=True, style=Pack(flex=1, height=300))
+
+        def reset(widget):
+            diagnostics.reset()
+            report.value = diagnostics.report()
+
+        async def save(widget):
+            path = os.path.join(self.paths.data, 'diagnostics.json')
+            try:
+                await self.worker.read(diagnostics.dump, path)
+                await self.main_window.dialog(toga.InfoDialog("Διαγνωστικά", f"Αποθηκεύτηκαν στο {path}"))
+            except Exception as ex:
+                log.error("Diagnostics dump error: %s", ex)
+                await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", f"Αποτυχία αποθήκευσης: {ex}"))
+
+        content = toga.Box(
+            children=[
+                toga.Label("Διαγνωστικά", style=Pack(font_weight='bold', font_size=15, margin_bottom=10)),
+                report,
+                toga.Box(
+                    children=[
+                        toga.Button("Αποθήκευση JSON", on_press=save, style=Pack(margin=5)),
+                        toga.Button("Μηδενισμός", on_press=reset, style=Pack(margin=5)),
+                        toga.Button("Πίσω", on_press=self.restore_tabs, style=Pack(margin=5)),
+                    ],
+                    style=Pack(direction=ROW)
+                ),
+            ],
+            style=Pack(direction=COLUMN, margin=10)
+        )
+        self.show_view(content)
+
+    def report_import_progress(self, done, total):
+        """Progress callback for database.import_data"""
+        if self.import_progress is None:
+            return
+        self.import_progress.value = done / total if total else 1.0
 
     async def handle_med_activate(self, widget, row):
         med_id = int(row.id)
@@ -771,6 +943,12 @@ class Farmasave(toga.App):
         boxes_input = toga.TextInput(value=str(med_data['boxes']) if is_edit and med_data['boxes'] is not None else "", placeholder="Κουτιά")
         pieces_input = toga.TextInput(value=str(med_data['pieces']) if is_edit and med_data['pieces'] is not None else "", placeholder="Τεμάχια")
         dosage_input = toga.TextInput(value=str(med_data['dosage']) if is_edit and med_data['dosage'] is not None else "", placeholder="Δόση/Ημ.")
+        # Non-daily / multi-dose regimens in short form (regimens.parse); when
+        # set they replace the daily dosage from today on
+        current_regimens = (await self.worker.read(database.get_regimens, med_data['id'], date.today().toordinal())
+                            if is_edit else [])
+        regimen_text = "; ".join(regimen.describe() for regimen in current_regimens)
+        regimen_input = toga.TextInput(value=regimen_text, placeholder="π.χ. 2+1, 1/2 (μέρα παρά μέρα), 1/7 (εβδομαδιαία)")
 
         content = toga.Box(
             children=[
@@ -780,6 +958,7 @@ class Farmasave(toga.App):
                 toga.Label("Κουτιά:"), boxes_input,
                 toga.Label("Τεμάχια:"), pieces_input,
                 toga.Label("Δόση/Ημ.:"), dosage_input,
+                toga.Label("Σχήμα (προαιρετικό):"), regimen_input,
             ],
             style=Pack(direction=COLUMN, margin=10)
         )
@@ -800,18 +979,30 @@ class Farmasave(toga.App):
                 await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", "Το όνομα και ο τύπος είναι υποχρεωτικά."))
                 return
 
+            text = (regimen_input.value or "").strip()
+            today = date.today().toordinal()
+            try:
+                new_regimens = [regimens.parse(part, None, today) for part in text.split(';') if part.strip()]
+            except ValueError:
+                await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", "Μη έγκυρο σχήμα. Παραδείγματα: 2+1, 1/2, 1/7"))
+                return
+
             if is_edit:
-                database.update_medication(med_data['id'], name, typ, ppb, boxes, pieces, dosage)
+                med_id = med_data['id']
+                await self.worker.write(database.update_medication, med_id, name, typ, ppb, boxes, pieces, dosage)
             else:
-                database.add_medication(name, typ, ppb, boxes, pieces, dosage)
+                med_id = await self.worker.write(database.add_medication, name, typ, ppb, boxes, pieces, dosage)
+            # Untouched text keeps dated regimens (e.g. a taper) as they are
+            if text != regimen_text:
+                await self.worker.write(database.set_regimens, med_id, new_regimens)
             
-            self.refresh_medications()
+            await self.refresh_medications()
             self.restore_tabs()
 
         async def delete_medication(widget):
             if await self.main_window.question_dialog("Διαγραφή", "Είστε σίγουροι ότι θέλετε να διαγράψετε αυτό το φάρμακο;"):
-                database.delete_medication(med_data['id'])
-                self.refresh_medications()
+                await self.worker.write(database.delete_medication, med_data['id'])
+                await self.refresh_medications()
                 self.restore_tabs()
 
         save_btn = toga.Button("Αποθήκευση", on_press=save_medication, style=Pack(margin=5))
@@ -829,7 +1020,7 @@ class Farmasave(toga.App):
     async def _run_export(self):
         """Async wrapper for export - called via add_background_task"""
         try:
-            print("DEBUG: _run_export started")
+            log.debug("_run_export started")
             suggested_name = f"meds_{datetime.now().strftime('%Y%m%d_%H%M')}.json"
             dialog = toga.SaveFileDialog(
                 title="Εξαγωγή Δεδομένων",
@@ -837,32 +1028,31 @@ class Farmasave(toga.App):
                 file_types=['json'],
             )
             path = await self.main_window.dialog(dialog)
-            print(f"DEBUG: Export path selected: {path}")
+            log.debug("Export path selected: %s", path)
             if path:
-                data = database.export_data()
                 export_path = str(path)
-                with open(export_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=4)
+                with open(export_path, 'wb') as f:
+                    await self.write_export(f.write)
                 await self.main_window.dialog(toga.InfoDialog("Επιτυχία", f"Τα δεδομένα εξήχθησαν επιτυχώς.\nΑρχείο: {os.path.basename(export_path)}"))
         except Exception as ex:
-            print(f"DEBUG: Export Error: {ex}")
+            log.error("Export Error: %s", ex)
             await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", f"Αποτυχία εξαγωγής: {ex}"))
 
     async def _run_import(self):
         """Async wrapper for import - called via add_background_task"""
         try:
-            print("DEBUG: _run_import started")
+            log.debug("_run_import started")
             dialog = toga.OpenFileDialog(
                 title="Εισαγωγή Δεδομένων",
                 multiple_select=False,
                 file_types=['json'],
             )
             path = await self.main_window.dialog(dialog)
-            print(f"DEBUG: Import path selected: {path}")
+            log.debug("Import path selected: %s", path)
             if path:
                 await self._open_date_dialog_for_import(path)
         except Exception as ex:
-            print(f"DEBUG: Import Error: {ex}")
+            log.error("Import Error: %s", ex)
             await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", f"Αποτυχία εισαγωγής: {ex}"))
 
     async def _open_date_dialog_for_import(self, file_path):
@@ -899,18 +1089,15 @@ class Farmasave(toga.App):
             ))
             
             if confirm:
-                print(f"DEBUG: Importing from {import_path}")
-                with open(import_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                database.import_data(data, selected_date)
-                self.refresh_medications()
-                self.refresh_stock()
-                self.refresh_schedule()
+                log.debug("Importing from %s", import_path)
+                data = await self.worker.read(load_json_file, import_path)
+                await self.worker.write(database.import_data, data, selected_date, progress=self.worker.on_loop(self.report_import_progress))
+                await self.refresh_all()
                 await self.main_window.dialog(toga.InfoDialog("Επιτυχία", "Η εισαγωγή ολοκληρώθηκε!"))
         except json.JSONDecodeError:
             await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", "Το αρχείο δεν είναι έγκυρο JSON."))
         except Exception as ex:
-            print(f"DEBUG: Import Error: {ex}")
+            log.error("Import Error: %s", ex)
             await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", f"Αποτυχία εισαγωγής: {ex}"))
 
     async def handle_export(self, widget):
@@ -918,17 +1105,15 @@ class Farmasave(toga.App):
         async def perform_export(window, path):
             if path:
                 try:
-                    data = database.export_data()
-                    
                     # Convert to string path safely for open()
                     export_path = str(path)
-                    print(f"DEBUG: Exporting to {export_path}")
+                    log.debug("Exporting to %s", export_path)
                     
-                    with open(export_path, 'w', encoding='utf-8') as f:
-                        json.dump(data, f, ensure_ascii=False, indent=4)
+                    with open(export_path, 'wb') as f:
+                        await self.write_export(f.write)
                     await self.main_window.dialog(toga.InfoDialog("Επιτυχία", f"Τα δεδομένα εξήχθησαν επιτυχώς.\nΑρχείο: {os.path.basename(export_path)}"))
                 except Exception as ex:
-                    print(f"DEBUG: Export Error: {ex}")
+                    log.error("Export Error: %s", ex)
                     await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", f"Αποτυχία εξαγωγής: {ex}\nΠροσπαθήστε να αποθηκεύσετε στο φάκελο 'Λήψεις' (Downloads)."))
 
         suggested_name = f"meds_{datetime.now().strftime('%Y%m%d_%H%M')}.json"
@@ -947,12 +1132,17 @@ class Farmasave(toga.App):
         
         boxes_input = toga.TextInput(value=str(row.boxes), placeholder="Κουτιά")
         pieces_input = toga.TextInput(value=str(row.pieces), placeholder="Τεμάχια")
+        # Received quantities start empty; the recount fields above hold the current balance
+        received_boxes_input = toga.TextInput(placeholder="Κουτιά")
+        received_pieces_input = toga.TextInput(placeholder="Τεμάχια")
 
         content = toga.Box(
             children=[
                 toga.Label(f"Ενημέρωση Αποθέματος: {name}"),
                 toga.Label("Κουτιά:"), boxes_input,
                 toga.Label("Τεμάχια:"), pieces_input,
+                toga.Label("Παραλαβή - Κουτιά:"), received_boxes_input,
+                toga.Label("Παραλαβή - Τεμάχια:"), received_pieces_input,
             ],
             style=Pack(direction=COLUMN, margin=10)
         )
@@ -961,17 +1151,35 @@ class Farmasave(toga.App):
             try:
                 boxes = int(boxes_input.value or 0)
                 pieces = int(pieces_input.value or 0)
-                database.update_stock(med_id, boxes, pieces)
-                self.refresh_stock()
-                self.refresh_medications()
+                await self.worker.write(database.update_stock, med_id, boxes, pieces)
+                await self.refresh_stock()
+                await self.refresh_medications()
                 self.restore_tabs()
             except ValueError:
                 await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", "Παρακαλώ εισάγετε έγκυρους αριθμούς."))
 
+        async def restock(widget):
+            # The received boxes/pieces are added to the current balance
+            try:
+                boxes = int(received_boxes_input.value or 0)
+                pieces = int(received_pieces_input.value or 0)
+            except ValueError:
+                await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", "Παρακαλώ εισάγετε έγκυρους αριθμούς."))
+                return
+            try:
+                await self.worker.write(database.restock, med_id, boxes, pieces)
+            except ValueError as ex:
+                await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", f"Αποτυχία παραλαβής: {ex}"))
+                return
+            await self.refresh_stock()
+            await self.refresh_medications()
+            self.restore_tabs()
+
         save_btn = toga.Button("Αποθήκευση", on_press=save_stock, style=Pack(margin=5))
+        restock_btn = toga.Button("Παραλαβή (+)", on_press=restock, style=Pack(margin=5))
         cancel_btn = toga.Button("Ακύρωση", on_press=self.restore_tabs, style=Pack(margin=5))
         
-        content.add(toga.Box(children=[save_btn, cancel_btn], style=Pack(direction=ROW)))
+        content.add(toga.Box(children=[save_btn, restock_btn, cancel_btn], style=Pack(direction=ROW)))
         self.show_view(content)
 
     async def handle_import_dialog(self, widget):
@@ -1006,24 +1214,21 @@ class Farmasave(toga.App):
                 try:
                     # Convert to string path safely
                     import_path = str(file_path)
-                    print(f"DEBUG: Importing from {import_path}")
+                    log.debug("Importing from %s", import_path)
                     
                     if not os.path.exists(import_path):
                         # On Android, OpenFileDialog might return a URI-like path or a restricted path
                         # Here we try to see if we can read it
-                        print(f"DEBUG: Path {import_path} does not exist according to os.path.exists")
+                        log.warning("Path %s does not exist according to os.path.exists", import_path)
                     
-                    with open(import_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    database.import_data(data, selected_date)
-                    self.refresh_medications()
-                    self.refresh_stock()
-                    self.refresh_schedule()
+                    data = await self.worker.read(load_json_file, import_path)
+                    await self.worker.write(database.import_data, data, selected_date, progress=self.worker.on_loop(self.report_import_progress))
+                    await self.refresh_all()
                     await self.main_window.dialog(toga.InfoDialog("Επιτυχία", "Η εισαγωγή ολοκληρώθηκε!"))
                 except json.JSONDecodeError:
                     await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", "Το αρχείο δεν είναι έγκυρο JSON."))
                 except Exception as ex:
-                    print(f"DEBUG: Import Error: {ex}")
+                    log.error("Import Error: %s", ex)
                     await self.main_window.dialog(toga.ErrorDialog("Σφάλμα", f"Αποτυχία εισαγωγής: {ex}"))
 
         save_btn = toga.Button("Εισαγωγή", on_press=proceed_import, style=Pack(margin=5))
@@ -1031,5 +1236,12 @@ class Farmasave(toga.App):
         content.add(toga.Box(children=[save_btn, cancel_btn], style=Pack(direction=ROW)))
         self.show_view(content)
 
+# Refreshes are the hot path of every tab switch and write
+diagnostics.instrument_methods(Farmasave, lambda name: name.startswith('refresh_'), prefix='app')
+
 def main():
+    # Set FARMASAVE_LOG_LEVEL=DEBUG for the old verbose output
+    logging.basicConfig(level=os.environ.get('FARMASAVE_LOG_LEVEL', 'WARNING').upper(),
+                        format="%(levelname)s %(name)s: %(message)s")
+    diagnostics.enable_from_environment()
     return Farmasave("Farmasave", "com.spyalekos.farmasave", version="2.7.0")
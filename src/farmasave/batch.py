@@ -0,0 +1,88 @@
+"""Depletion reports across many profile databases, one process per database.
+
+A directory may hold profile databases either as `<profile>.db` files or as
+`<profile>/medications.db` (the app's data directory layout). Each database
+is summarized in a worker process and the per-profile lists, which already
+come sorted by depletion day, are merged into a single "who runs out first"
+ranking.
+"""
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from . import database
+from . import calculations
+
+
+def find_databases(directory):
+    """[(profile name, database path)] found in `directory`, sorted by name.
+
+    Other *.db files (no medications table, or not SQLite at all) are skipped.
+    """
+    found = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith('.db'):
+            found.append((entry.name[:-3], entry.path))
+        elif entry.is_dir():
+            path = os.path.join(entry.path, 'medications.db')
+            if os.path.isfile(path):
+                found.append((entry.name, path))
+    return sorted((profile, path) for profile, path in found if database.is_database(path))
+
+
+def summarize(profile, path, days_ahead=30):
+    """Depletion list and schedule summary of one database (runs in a worker process).
+
+    Returns plain picklable data; a database that cannot be read is
+    reported through 'error' instead of failing the whole batch. Databases
+    are opened read-only, so one with an older schema is reported too
+    rather than migrated behind the app's back.
+    """
+    try:
+        with database.use_database(path, readonly=True):
+            version = database.schema_version()
+            if version < len(database.MIGRATIONS):
+                return {'profile': profile, 'path': path,
+                        'error': f"schema version {version} is older than {len(database.MIGRATIONS)}; open it with farmasave to upgrade"}
+            _, depletion_list = calculations.get_depletion_info()
+            intervals = calculations.schedule_intervals(days_ahead)
+    except Exception as e:
+        return {'profile': profile, 'path': path, 'error': str(e)}
+    finally:
+        database.close_connections()
+
+    horizon_end = date.today().toordinal() + days_ahead
+    return {
+        'profile': profile,
+        'path': path,
+        'depletion': depletion_list,
+        'running_out': sum(1 for _, day, _, _ in depletion_list if day.toordinal() < horizon_end),
+        'schedule': intervals,
+    }
+
+
+def _ranked(summary):
+    profile = summary['profile']
+    for name, day, days_left, balance in summary.get('depletion', ()):
+        yield day, profile, name, days_left, balance
+
+
+def batch_report(databases, days_ahead=30, processes=None):
+    """Summarize every (profile, path) in `databases` in a process pool.
+
+    Returns {'profiles': [summary, ...], 'ranking': [(depletion_date,
+    profile, name, days_left, balance), ...]} with the ranking ordered by
+    depletion date across all profiles.
+    """
+    databases = list(databases)
+    if not databases:
+        return {'profiles': [], 'ranking': []}
+
+    workers = min(processes or os.cpu_count() or 1, len(databases))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        summaries = list(pool.map(summarize, *zip(*databases), [days_ahead] * len(databases)))
+
+    # Each profile's list is already sorted, so a k-way merge is enough
+    ranking = list(heapq.merge(*(_ranked(summary) for summary in summaries), key=lambda entry: (entry[0], entry[1])))
+    return {'profiles': summaries, 'ranking': ranking}
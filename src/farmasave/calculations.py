@@ -1,69 +1,536 @@
-from datetime import datetime, timedelta
+import heapq
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import date, timedelta
+from itertools import accumulate, repeat
+from operator import attrgetter
 from . import database
+from . import regimens
+
+# Forecasting backend: 'numpy' (whole-catalog array operations) or 'python'
+# loops, with identical results. None chooses per call: NumPy for work of at
+# least NUMPY_MIN_SIZE elements (medications, days or curve points) when it
+# is installed and FARMASAVE_NO_NUMPY is not set. NumPy is imported on first
+# use, never at startup; below the threshold its ~100 ms import would cost
+# more than the loops it replaces.
+BACKENDS = ('numpy', 'python')
+BACKEND = None
+NUMPY_MIN_SIZE = 50000
+np = None
+_numpy_loaded = False
+
+# Ordinal of 1970-01-01, day zero of numpy's datetime64[D]
+_EPOCH_DAY = date(1970, 1, 1).toordinal()
+# Stock curves are computed this many cells (medications x days) at a time
+CURVE_BLOCK = 1 << 20
+
+def _load_numpy():
+    """The numpy module, imported on the first call, or None if it is not installed"""
+    global np, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            import numpy
+        except ImportError:  # the Android build ships without NumPy
+            numpy = None
+        np = numpy
+        _numpy_loaded = True
+    return np
+
+def set_backend(name):
+    """Force the 'numpy' or 'python' backend, or None to choose automatically"""
+    global BACKEND
+    if name is not None and name not in BACKENDS:
+        raise ValueError(f"unknown backend {name!r}")
+    if name == 'numpy' and _load_numpy() is None:
+        raise ValueError("NumPy is not installed")
+    BACKEND = name
+    clear_caches()
+
+def _use_numpy(size):
+    """Whether to process `size` elements with NumPy"""
+    if BACKEND == 'python':
+        return False
+    if BACKEND is None and (size < NUMPY_MIN_SIZE or os.environ.get('FARMASAVE_NO_NUMPY', '') not in ('', '0')):
+        return False
+    return _load_numpy() is not None
+
+class InventorySnapshot:
+    """Live balances of every medication, computed once per data version and day"""
+
+    def __init__(self, version, today, items, regimens=None):
+        self.version = version
+        self.today = today
+        self.items = items
+        # {med_id: [regimens.Regimen]} for medications with regimens in effect
+        # today or later (with their finished ones)
+        self.regimens = regimens or {}
+        self._depleting = None
+        self._arrays = None
+
+    @property
+    def depleting(self):
+        """Medications with a dosage, soonest to run out first (from the depletion index)"""
+        if self._depleting is None:
+            self._depleting = database.query_depleting(self.today.toordinal())
+        return self._depleting
+
+    def arrays(self):
+        """(ids, names, balances, dosages, plain) NumPy arrays in inventory order.
+
+        `plain` marks the medications without regimens, whose stock falls by
+        their daily dosage. Only called once _use_numpy() has loaded NumPy.
+        """
+        if self._arrays is None:
+            count = len(self.items)
+            self._arrays = (
+                np.fromiter(map(attrgetter('id'), self.items), np.int64, count),
+                np.array([item.name for item in self.items], dtype=object),
+                np.fromiter(map(attrgetter('balance'), self.items), np.int64, count),
+                np.fromiter(map(attrgetter('dosage'), self.items), np.int64, count),
+                np.fromiter((item.id not in self.regimens for item in self.items), bool, count),
+            )
+        return self._arrays
+
+# Latest snapshot per database path
+_snapshots = {}
+
+def get_inventory():
+    """Return the shared inventory snapshot, rebuilding it only after a write or at midnight"""
+    # Keyed by the stored revision, not data_version(): the snapshot is shared
+    # by every thread, and PRAGMA data_version only counts commits as seen
+    # from the calling thread's own connection (see _memoized).
+    path = database.db_path()
+    version = database.persistent_version()
+    today = date.today()
+    snapshot = _snapshots.get(path)
+    if snapshot is not None and snapshot.version == version and snapshot.today == today:
+        return snapshot
+
+    # Balances, days left and depletion days all come from SQL (see
+    # database.SQL_BALANCES) as models.Medication rows, projected from each
+    # medication's latest stock ledger checkpoint (recount, restock or
+    # extra consumption). Medications whose regimens have all ended are
+    # plain daily-dosage ones from today on.
+    day = today.toordinal()
+    current = {med_id: regs for med_id, regs in database.query_regimens().items()
+               if any(regimen.last_day > day for regimen in regs)}
+    snapshot = _snapshots[path] = InventorySnapshot(version, today, database.query_balances(day), current)
+    return snapshot
+
+# Results of get_depletion_info/schedule_intervals/generate_schedule, LRU
+# keyed by (database, revision, date, function, horizon). Every write made
+# through database.* (import included) bumps the stored revision, so stale
+# entries are never hit again and simply age out. The revision is used rather
+# than data_version() because PRAGMA data_version is per connection, and the
+# worker's reader threads each have their own.
+MEMO_SIZE = 8
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+def _memoized(kind, arg, compute):
+    """Return compute(arg), reusing the result while the data and date are unchanged"""
+    key = (database.db_path(), database.persistent_version(), date.today(), kind, arg)
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+    result = compute(arg)
+    with _memo_lock:
+        _memo[key] = result
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return result
+
+def clear_caches():
+    """Forget all snapshots and memoized results (benchmarks, tests)"""
+    _snapshots.clear()
+    with _memo_lock:
+        _memo.clear()
 
 def get_depletion_info():
-    meds = database.get_all_medications()
-    depletion_list = []
-    now = datetime.now().date()
-    for med in meds:
-        # med: (id, name, typ, ppb, boxes, pieces, dosage, inv_date)
-        med_id, name, typ, ppb, boxes, pieces, dosage, inv_date_str = med
-        dosage = dosage if dosage is not None else 0
-        
-        # Calculate initial total
-        initial_total = pieces + (boxes * ppb)
-        
-        # Calculate consumption since inventory date
-        if inv_date_str:
-            inv_date = datetime.strptime(inv_date_str, "%Y-%m-%d").date()
-            days_passed = (now - inv_date).days
-            consumed = days_passed * dosage
-        else:
-            consumed = 0
-            
-        current_total = max(0, initial_total - consumed)
-        
-        if dosage > 0 and current_total > 0:
-            days_left = current_total / dosage
-            depletion_date = datetime.now() + timedelta(days=days_left)
-            depletion_list.append((name, depletion_date.date(), days_left, current_total))
-        elif dosage > 0 and current_total <= 0:
-            # Already ran out
-            depletion_list.append((name, now, 0, 0))
-            
+    """(earliest, [(name, depletion_date, days_left, balance)]), memoized; do not mutate"""
+    return _memoized('depletion', None, _depletion_info)
+
+def _depletion_info(_):
+    # Already ran out: depletion date is today with 0 days left.
+    # The list comes sorted from the depletion_day index.
+    items = get_inventory().depleting
+    if _use_numpy(len(items)):
+        depletion_list = list(zip(map(attrgetter('name'), items),
+                                  _dates_of(map(attrgetter('depletion_day'), items), len(items)),
+                                  map(attrgetter('days_left'), items),
+                                  map(attrgetter('balance'), items)))
+    else:
+        depletion_list = [(item.name, item.depletion_date, item.days_left, item.balance)
+                          for item in items]
+
     if depletion_list:
-        depletion_list.sort(key=lambda x: x[1])
         earliest = depletion_list[0]
         return earliest, depletion_list
     return None, []
 
+def _dates_of(days, count):
+    """datetime.date objects of `count` day ordinals, converted in one NumPy pass"""
+    ordinals = np.fromiter(days, np.int64, count)
+    return (ordinals - _EPOCH_DAY).astype('datetime64[D]').tolist()
+
+def _date_range(start_date, count, step=1):
+    """[start_date, start_date + step days, ...] of length `count`"""
+    if _use_numpy(count):
+        first = np.datetime64(start_date, 'D')
+        return np.arange(first, first + count * step, step).tolist()
+    return [start_date + timedelta(days=i * step) for i in range(count)]
+
+def next_depletion():
+    """The medication that runs out first, or None; a single index lookup"""
+    rows = database.query_depleting(date.today().toordinal(), limit=1)
+    return rows[0] if rows else None
+
+def running_out_within(days):
+    """Medications that run out within `days` days, soonest first (an index range scan)"""
+    return database.query_depleting(date.today().toordinal(), within_days=days)
+
+def balances_on(when):
+    """{medication id: balance} on the date `when`, past or future.
+
+    From today on the balances are projected from the inventory snapshot,
+    without a query. Past balances come from the stock ledger checkpoints
+    (one index seek per medication, no replay); medications added after
+    `when` are left out.
+    """
+    snapshot = get_inventory()
+    first = (when - snapshot.today).days
+    if first >= 0:
+        return {med_id: curve[0] for med_id, curve in _forecast_curves(snapshot, 0, None, first, 1, 1)}
+    return {med_id: balance for med_id, _, balance in database.query_balances_on(when.toordinal())
+            if balance is not None}
+
+def balance_on(med_id, when):
+    """Balance of one medication on the date `when`, or None before its first stock entry"""
+    return database.query_balance_on(med_id, when.toordinal())
+
+def stock_history(med_id, start, end):
+    """Ledger entries (counts, restocks, extra consumption) of one medication between two dates"""
+    return database.query_ledger(med_id, start.toordinal(), end.toordinal())
+
+def days_supplied(stock, dosage):
+    """Number of days, counting today, on which a full or partial dose is still taken"""
+    if dosage <= 0 or stock <= 0:
+        return 0
+    # Stock is decremented once per day while it is positive: ceil(stock / dosage)
+    return -(-stock // dosage)
+
+def schedule_intervals(days_ahead=30):
+    """Return the schedule as run-length intervals [(first_date, last_date, names)].
+
+    Each medication's exhaustion day is computed directly, so the cost depends
+    on the number of medications and not on the length of the horizon.
+    Memoized per horizon; the returned list is shared, do not mutate it.
+    """
+    return _memoized('intervals', days_ahead, _schedule_intervals)
+
+def _schedule_intervals(days_ahead):
+    snapshot = get_inventory()
+    start_date = snapshot.today
+    runs = _daily_runs(snapshot, days_ahead)
+    regimen_days = _regimen_days(snapshot, days_ahead) if snapshot.regimens else {}
+
+    # The daily meds' active set only shrinks, on the days where some med
+    # runs out; regimen doses only break the runs on the days they are taken
+    cutoffs = {cutoff for cutoff, _ in runs}
+    boundaries = sorted(cutoffs.union(regimen_days, (day + 1 for day in regimen_days)) - {0})
+    position = 0
+    active = runs[0][1] if runs else []
+    intervals = []
+    first_day = 0
+    extend = False
+    previous_labels = None
+    for boundary in boundaries:
+        labels = regimen_days.get(first_day)
+        names = active + labels if labels else active
+        if names and extend and labels == previous_labels:
+            first_date, _, names = intervals[-1]
+            intervals[-1] = (first_date, start_date + timedelta(days=boundary - 1), names)
+        elif names:
+            intervals.append((start_date + timedelta(days=first_day),
+                              start_date + timedelta(days=boundary - 1),
+                              names))
+        extend = bool(names)
+        previous_labels = labels
+        if boundary in cutoffs:
+            position += 1
+            active = runs[position][1] if position < len(runs) else []
+            extend = False
+        first_day = boundary
+    return intervals
+
+def _daily_runs(snapshot, days_ahead):
+    """[(cutoff, names)] ascending: the daily-dosage meds still taken on the days before `cutoff`.
+
+    Each medication's exhaustion day (capped at the horizon) is computed
+    directly; the names of a run are those lasting at least until its cutoff,
+    in inventory order.
+    """
+    if _use_numpy(len(snapshot.items)):
+        _, names, balances, dosages, plain = snapshot.arrays()
+        taking = plain & (dosages > 0) & (balances > 0)
+        # days_supplied() for the whole catalog: ceil(balance / dosage)
+        days = np.where(taking, -(-balances // np.where(taking, dosages, 1)), 0)
+        days = np.minimum(days, days_ahead)
+        index = np.flatnonzero(days > 0)
+        runs = []
+        for cutoff in np.unique(days[index]).tolist():
+            runs.append((cutoff, names[index].tolist()))
+            index = index[days[index] > cutoff]
+        return runs
+
+    med_status = []
+    for item in snapshot.items:
+        if item.id in snapshot.regimens:
+            continue
+        days = min(days_supplied(item.balance, item.dosage), days_ahead)
+        if days > 0:
+            med_status.append((item.name, days))
+    runs = []
+    for cutoff in sorted({days for _, days in med_status}):
+        runs.append((cutoff, [name for name, _ in med_status]))
+        med_status = [status for status in med_status if status[1] > cutoff]
+    return runs
+
+def _regimen_days(snapshot, days_ahead):
+    """{day offset: ["name (amounts)", ...]} of the doses of medications with regimens"""
+    today = snapshot.today.toordinal()
+    horizon = today + days_ahead
+    by_day = {}
+    for item in snapshot.items:
+        regs = snapshot.regimens.get(item.id)
+        if regs is None:
+            continue
+        # Doses are taken up to (not including) the day the stock runs out
+        end = horizon if item.depletion_day is None else min(item.depletion_day, horizon)
+        slots_on = {}
+        for regimen in regimens.with_daily(regs, item.dosage):
+            for day in regimen.iter_dose_days(today, end):
+                slots_on.setdefault(day, []).extend(regimen.slots)
+        for day, slots in slots_on.items():
+            by_day.setdefault(day - today, []).append(f"{item.name} ({'+'.join(map(str, slots))})")
+    return by_day
+
+def expand_schedule(intervals):
+    """Lazily yield (date, names) for every day covered by schedule_intervals()"""
+    for first_date, last_date, names in intervals:
+        for i in range((last_date - first_date).days + 1):
+            yield first_date + timedelta(days=i), names
+
 def generate_schedule(days_ahead=30):
-    meds = database.get_all_medications()
+    """Day-by-day [(date, names)] for the next `days_ahead` days (memoized, shared)"""
+    return _memoized('schedule', days_ahead, _generate_schedule)
+
+def _generate_schedule(days_ahead):
+    # Same output as list(expand_schedule(...)), with every date built in one pass
+    intervals = schedule_intervals(days_ahead)
+    if not intervals:
+        return []
+    start_date = intervals[0][0]
+    dates = _date_range(start_date, (intervals[-1][1] - start_date).days + 1)
     schedule = []
-    start_date = datetime.now().date()
-    
-    # Pre-calculate current stock for each med
-    med_status = []
-    for med in meds:
-        med_id, name, typ, ppb, boxes, pieces, dosage, inv_date_str = med
-        dosage = dosage if dosage is not None else 0
-        initial_total = pieces + (boxes * ppb)
-        if inv_date_str:
-            inv_date = datetime.strptime(inv_date_str, "%Y-%m-%d").date()
-            days_passed = (start_date - inv_date).days
-            consumed = days_passed * dosage
-        else:
-            consumed = 0
-        current_total = max(0, initial_total - consumed)
-        med_status.append({'name': name, 'dosage': dosage, 'stock': current_total})
-
-    for i in range(days_ahead):
-        date = start_date + timedelta(days=i)
-        day_meds = []
-        for status in med_status:
-            if status['dosage'] > 0 and status['stock'] > 0:
-                day_meds.append(status['name'])
-                status['stock'] -= status['dosage']
-        if day_meds:
-            schedule.append((date, day_meds))
+    for first_date, last_date, names in intervals:
+        first = (first_date - start_date).days
+        schedule.extend(zip(dates[first:first + (last_date - first_date).days + 1], repeat(names)))
     return schedule
+
+def curve_dates(start, end, step=1):
+    """The dates sampled by stock_curves(start, end, step), the x axis of a chart"""
+    return _date_range(start, _sample_count(start, end, step), step)
+
+def _sample_count(start, end, step):
+    if step < 1:
+        raise ValueError("step must be at least one day")
+    return max(0, (end - start).days // step + 1)
+
+def stock_curves(start, end, step=1, offset=0, limit=None):
+    """[(medication id, array('i'))]: each medication's stock on start, start + step, ... up to end.
+
+    Values match balances_on() for each sampled date, with 0 before a
+    medication's first stock entry. A `step` of several days downsamples
+    long ranges, and `offset`/`limit` page through the medications in
+    inventory order. Ranges from today on are computed from the snapshot in
+    bulk; past ranges read each medication's ledger checkpoints.
+    Memoized; the arrays are shared, do not mutate them.
+    """
+    _sample_count(start, end, step)
+    return _memoized('curves', (start, end, step, offset, limit), _stock_curves)
+
+def stock_curve(med_id, start, end, step=1):
+    """The stock curve of one medication (see stock_curves), or None if there is no such medication"""
+    snapshot = get_inventory()
+    for position, item in enumerate(snapshot.items):
+        if item.id == med_id:
+            return _curves(snapshot, position, position + 1, start, end, step)[0][1]
+    return None
+
+def _stock_curves(args):
+    start, end, step, offset, limit = args
+    stop = None if limit is None else offset + limit
+    return _curves(get_inventory(), offset, stop, start, end, step)
+
+def _curves(snapshot, offset, stop, start, end, step):
+    count = _sample_count(start, end, step)
+    first = (start - snapshot.today).days
+    if first >= 0:
+        return _forecast_curves(snapshot, offset, stop, first, count, step)
+    days = [start.toordinal() + i * step for i in range(count)]
+    # Past days also need the regimens that have ended since
+    grouped = database.query_regimens()
+    return [(item.id, _ledger_curve(item.id, grouped.get(item.id), days))
+            for item in snapshot.items[offset:stop]]
+
+def _ledger_curve(med_id, regs, days):
+    # Walk the checkpoints alongside the sampled days, projecting each one
+    # forward until the next takes over (as database.query_balance_on does)
+    if not days:
+        return array('i')
+    entries = database.query_checkpoints(med_id, days[0], days[-1])
+    values = []
+    position = -1
+    plan = None
+    for day in days:
+        while position + 1 < len(entries) and entries[position + 1][0] <= day:
+            position += 1
+            plan = regimens.with_daily(regs, entries[position][2]) if regs is not None else None
+        if position < 0:
+            values.append(0)
+            continue
+        entry_day, balance, dosage = entries[position]
+        if plan is None:
+            used = (day - entry_day) * dosage
+        else:
+            used = regimens.consumption(plan, entry_day, day)
+        values.append(max(0, balance - used))
+    return array('i', values)
+
+def _forecast_curves(snapshot, offset, stop, first, count, step):
+    """Curves sampled at days first, first + step, ... from today, for items[offset:stop]"""
+    today = snapshot.today.toordinal()
+    items = snapshot.items[offset:stop]
+    curves = {}
+    if _use_numpy(len(items) * count):
+        ids, _, balances, dosages, plain = (column[offset:stop] for column in snapshot.arrays())
+        offsets = first + step * np.arange(count, dtype=np.int64)
+        rows = max(1, CURVE_BLOCK // max(count, 1))
+        for row in range(0, len(ids), rows):
+            block = balances[row:row + rows, None] - dosages[row:row + rows, None] * offsets
+            block = np.maximum(block, 0).astype(np.intc)
+            for med_id, is_plain, curve in zip(ids[row:row + rows].tolist(), plain[row:row + rows].tolist(), block):
+                if is_plain:
+                    curves[med_id] = array('i', curve.tobytes())
+    else:
+        for item in items:
+            if item.id not in snapshot.regimens:
+                balance, dosage = item.balance, item.dosage
+                curves[item.id] = array('i', [max(0, balance - (first + i * step) * dosage) for i in range(count)])
+
+    # Regimen doses are irregular: over a contiguous range lay out each dose
+    # and keep a running total, otherwise evaluate consumption() per sample
+    for item in items:
+        regs = snapshot.regimens.get(item.id)
+        if regs is None:
+            continue
+        regs = regimens.with_daily(regs, item.dosage)
+        balance = item.balance
+        if step == 1 and count:
+            taken = [0] * count
+            taken[0] = regimens.consumption(regs, today, today + first)
+            for regimen in regs:
+                for day in regimen.iter_dose_days(today + first, today + first + count - 1):
+                    taken[day - today - first + 1] += regimen.per_dose_day
+            used = accumulate(taken)
+        else:
+            used = (regimens.consumption(regs, today, today + first + i * step) for i in range(count))
+        curves[item.id] = array('i', [max(0, balance - amount) for amount in used])
+    return [(item.id, curves[item.id]) for item in items]
+
+def plan_orders(days_ahead=90, lead_time=2, safety_days=7, cover_days=30, window=7):
+    """Pharmacy trips for the next `days_ahead` days: [(trip date, [(med_id, name, boxes, need date)])].
+
+    An order is needed when the stock would fall to `safety_days` of doses
+    (the need date) and arrives `lead_time` days after the trip; it buys
+    whole boxes lasting `cover_days` past the run-out day. Orders may be
+    placed up to `window` days early, and trips are chosen so that as few as
+    possible cover every order. Orders already late go on a trip today.
+    Memoized; the returned list is shared, do not mutate it.
+    """
+    if min(lead_time, safety_days, window) < 0 or cover_days < 1:
+        raise ValueError("lead time, safety stock and window cannot be negative, cover must be at least one day")
+    return _memoized('orders', (days_ahead, lead_time, safety_days, cover_days, window), _plan_orders)
+
+def _plan_orders(args):
+    days_ahead, lead_time, safety_days, cover_days, window = args
+    snapshot = get_inventory()
+    today = snapshot.today.toordinal()
+    last_day = today + days_ahead
+
+    def next_order(position, stock):
+        # (latest trip day, position, need day, boxes, stock once delivered),
+        # or None if the stock lasts beyond the horizon
+        item, (used, run_out) = items[position], usage[position]
+        empty = run_out(stock)
+        if empty is None:
+            return None
+        need = max(today, empty - safety_days)
+        latest = max(today, need - lead_time)
+        if latest >= last_day:
+            return None
+        # used(empty + 1) > stock, so at least one box is always bought
+        pieces_per_box = max(1, item.pieces_per_box)
+        boxes = -(-(used(empty + cover_days) - stock) // pieces_per_box)
+        return latest, position, need, boxes, stock + boxes * pieces_per_box
+
+    items = []
+    usage = []
+    for item in snapshot.items:
+        functions = _usage(item, snapshot.regimens.get(item.id), today)
+        if functions is not None:
+            items.append(item)
+            usage.append(functions)
+
+    # Orders pop by their latest possible trip day. A trip goes on the latest
+    # day of the first order it serves and takes every order whose window
+    # reaches back to it: the greedy interval stabbing, which needs the
+    # fewest trips. Each medication keeps only its next order in the heap.
+    pending = [order for order in map(next_order, range(len(items)), (item.balance for item in items)) if order]
+    heapq.heapify(pending)
+    trips = []
+    while pending:
+        latest, position, need, boxes, stock = heapq.heappop(pending)
+        if not trips or latest - window > trips[-1][0]:
+            trips.append((latest, {}))
+        orders = trips[-1][1]
+        item = items[position]
+        if item.id in orders:
+            _, name, previous, first_need = orders[item.id]
+            orders[item.id] = (item.id, name, previous + boxes, first_need)
+        else:
+            orders[item.id] = (item.id, item.name, boxes, date.fromordinal(need))
+        order = next_order(position, stock)
+        if order is not None:
+            heapq.heappush(pending, order)
+    return [(date.fromordinal(day), list(orders.values())) for day, orders in trips]
+
+def _usage(item, regs, today):
+    """(used(day), run_out(stock)) of a medication from today on, or None if it is not taken.
+
+    used(day) is the consumption in [today, day); run_out(stock) is the first
+    day whose doses no longer fit in `stock`, as in the depletion_day column.
+    """
+    if regs is not None:
+        plan = regimens.with_daily(regs, item.dosage)
+        return (lambda day: regimens.consumption(plan, today, day),
+                lambda stock: regimens.depletion_day(plan, stock, today))
+    dosage = item.dosage
+    if dosage <= 0:
+        return None
+    return (lambda day: (day - today) * dosage,
+            lambda stock: today + stock // dosage)
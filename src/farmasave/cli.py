@@ -0,0 +1,325 @@
+"""Headless command-line interface (no toga), e.g. for daily cron reports.
+
+    python -m farmasave depletion --within 7
+    python -m farmasave schedule --days 30
+    python -m farmasave orders --days 90 --lead-time 2
+    python -m farmasave export backup.json
+    python -m farmasave import backup.json --date 2026-01-31
+    python -m farmasave stock set 12 3 4
+    python -m farmasave regimen set 12 2+1
+    python -m farmasave report /srv/profiles --days 14
+
+Only database, calculations and jsonstream are used, so it starts without
+any of the GUI or Android bridge imports that app.py pulls in.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+from . import database
+from . import calculations
+from . import jsonstream
+from . import regimens
+
+COMMANDS = ('depletion', 'schedule', 'orders', 'export', 'import', 'stock', 'regimen', 'report')
+
+# Directory holding medications.db when --data-dir is not given
+DATA_DIR_ENV = 'FARMASAVE_DATA_DIR'
+
+
+def wants_cli(argv):
+    """True if `argv` (without the program name) asks for the CLI rather than the GUI"""
+    first = argv[0] if argv else ''
+    return first in COMMANDS or first in ('-h', '--help') or first.startswith('--data-dir')
+
+
+def _print_json(value):
+    json.dump(value, sys.stdout, ensure_ascii=False, indent=2, default=str)
+    sys.stdout.write("\n")
+
+
+def cmd_depletion(args):
+    if args.within is not None:
+        rows = [(m.name, m.depletion_date, m.days_left, m.balance) for m in calculations.running_out_within(args.within)]
+    else:
+        _, rows = calculations.get_depletion_info()
+    if args.limit is not None:
+        rows = rows[:args.limit]
+
+    if args.json:
+        _print_json([{'name': name, 'depletion_date': day, 'days_left': days_left, 'balance': balance}
+                     for name, day, days_left, balance in rows])
+        return 0
+    for name, day, days_left, balance in rows:
+        print(f"{day}  {days_left:7.1f}  {balance:7.0f}  {name}")
+    return 0
+
+
+def cmd_schedule(args):
+    intervals = calculations.schedule_intervals(args.days)
+    if args.json:
+        _print_json([{'from': first, 'to': last, 'medications': names} for first, last, names in intervals])
+        return 0
+    if args.daily:
+        for day, names in calculations.expand_schedule(intervals):
+            print(f"{day}  {', '.join(names)}")
+        return 0
+    for first, last, names in intervals:
+        period = f"{first}" if first == last else f"{first} – {last}"
+        print(f"{period}  {', '.join(names)}")
+    return 0
+
+
+def cmd_orders(args):
+    trips = calculations.plan_orders(args.days, args.lead_time, args.safety, args.cover, args.window)
+    if args.json:
+        _print_json([{'date': day, 'arrival': day + timedelta(days=args.lead_time),
+                      'orders': [{'id': med_id, 'name': name, 'boxes': boxes, 'needed_by': need}
+                                 for med_id, name, boxes, need in orders]}
+                     for day, orders in trips])
+        return 0
+    for day, orders in trips:
+        arrival = day + timedelta(days=args.lead_time)
+        print(f"{day}  (παραλαβή {arrival})")
+        for med_id, name, boxes, need in orders:
+            late = "  εκπρόθεσμη" if need < arrival else ""
+            print(f"    {boxes:4} κουτ.  {name}  (έως {need}){late}")
+    return 0
+
+
+def cmd_export(args):
+    indent = None if args.compact else 4
+    if args.file == '-':
+        count = jsonstream.write_json_array(database.iter_export_rows(), sys.stdout.buffer.write, indent=indent)
+        sys.stdout.buffer.flush()
+    else:
+        with open(args.file, 'wb') as f:
+            count = jsonstream.write_json_array(database.iter_export_rows(), f.write, indent=indent)
+    print(f"Εξήχθησαν {count} φάρμακα", file=sys.stderr)
+    return 0
+
+
+def cmd_import(args):
+    if args.file == '-':
+        data = list(jsonstream.iter_json_array(jsonstream.iter_file_chunks(sys.stdin.buffer)))
+    else:
+        with open(args.file, 'rb') as f:
+            data = list(jsonstream.iter_json_array(jsonstream.iter_file_chunks(f)))
+    database.import_data(data, args.date)
+    print(f"Εισήχθησαν {len(data)} φάρμακα (απογραφή {args.date})", file=sys.stderr)
+    return 0
+
+
+def cmd_stock_list(args):
+    rows = database.get_all_medications()
+    if args.json:
+        _print_json([{'id': m.id, 'name': m.name, 'boxes': m.current_boxes, 'pieces': m.current_pieces,
+                      'balance': m.balance, 'inventory_date': m.inventory_date} for m in rows])
+        return 0
+    for m in rows:
+        print(f"{m.id:6}  {m.current_boxes:4} κουτ. {m.current_pieces:4} τεμ.  υπόλοιπο {m.balance:7.0f}  {m.name}")
+    return 0
+
+
+def cmd_stock_set(args):
+    database.update_stock(args.id, args.boxes, args.pieces)
+    return 0
+
+
+def cmd_report(args):
+    from . import batch
+
+    databases = batch.find_databases(args.directory)
+    report = batch.batch_report(databases, args.days, processes=args.jobs)
+    ranking = report['ranking']
+    if args.within is not None:
+        last_day = date.today().toordinal() + args.within
+        ranking = [entry for entry in ranking if entry[0].toordinal() < last_day]
+    if args.limit is not None:
+        ranking = ranking[:args.limit]
+
+    errors = [summary for summary in report['profiles'] if 'error' in summary]
+    if args.json:
+        _print_json({
+            'profiles': [{'profile': s['profile'], 'path': s['path'], 'error': s['error']} if 'error' in s else
+                         {'profile': s['profile'], 'path': s['path'], 'running_out': s['running_out'],
+                          'first': s['depletion'][0] if s['depletion'] else None}
+                         for s in report['profiles']],
+            'ranking': [{'depletion_date': day, 'profile': profile, 'name': name, 'days_left': days_left, 'balance': balance}
+                        for day, profile, name, days_left, balance in ranking],
+        })
+    else:
+        for day, profile, name, days_left, balance in ranking:
+            print(f"{day}  {days_left:7.1f}  {balance:7.0f}  {profile}: {name}")
+        for summary in errors:
+            print(f"farmasave: {summary['profile']}: {summary['error']}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+def cmd_stock_restock(args):
+    balance = database.restock(args.id, args.boxes, args.pieces, args.date)
+    print(f"Νέο υπόλοιπο: {balance}", file=sys.stderr)
+    return 0
+
+
+def cmd_stock_consume(args):
+    balance = database.consume(args.id, args.pieces, args.date)
+    print(f"Νέο υπόλοιπο: {balance}", file=sys.stderr)
+    return 0
+
+
+def cmd_stock_history(args):
+    entries = calculations.stock_history(args.id, args.start, args.end)
+    if args.json:
+        _print_json([{'date': e.entry_date, 'kind': e.kind, 'quantity': e.quantity, 'balance': e.balance, 'dosage': e.dosage}
+                     for e in entries])
+        return 0
+    for e in entries:
+        print(f"{e.entry_date}  {e.kind:8} {e.quantity:6}  υπόλοιπο {e.balance:6}  δόση {e.dosage}/ημ.")
+    return 0
+
+
+def _parse_regimen(args):
+    start = (args.start or date.today()).toordinal()
+    end = args.end.toordinal() if args.end else None
+    return regimens.parse(args.regimen, args.id, start, end)
+
+
+def cmd_regimen_list(args):
+    for regimen in database.get_regimens(args.id):
+        end = date.fromordinal(regimen.end_day) if regimen.end_day is not None else "…"
+        print(f"{date.fromordinal(regimen.start_day)} – {end}  {regimen.describe()}")
+    return 0
+
+
+def cmd_regimen_set(args):
+    database.set_regimens(args.id, [_parse_regimen(args)])
+    return 0
+
+
+def cmd_regimen_add(args):
+    current = database.get_regimens(args.id, date.today().toordinal())
+    database.set_regimens(args.id, current + [_parse_regimen(args)])
+    return 0
+
+
+def cmd_regimen_clear(args):
+    database.set_regimens(args.id, [])
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='farmasave', description="Farmasave χωρίς γραφικό περιβάλλον")
+    parser.add_argument('--data-dir', default=os.environ.get(DATA_DIR_ENV, '.'),
+                        help=f"φάκελος του medications.db (προεπιλογή: ${DATA_DIR_ENV} ή ο τρέχων)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('depletion', help="ημερομηνίες εξάντλησης, νωρίτερη πρώτη")
+    p.add_argument('--within', type=int, metavar='DAYS', help="μόνο όσα τελειώνουν μέσα σε DAYS ημέρες")
+    p.add_argument('--limit', type=int, help="το πολύ τόσες γραμμές")
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_depletion)
+
+    p = commands.add_parser('schedule', help="πρόγραμμα λήψης")
+    p.add_argument('--days', type=int, default=30, help="ορίζοντας σε ημέρες (προεπιλογή: %(default)s)")
+    p.add_argument('--daily', action='store_true', help="μία γραμμή ανά ημέρα")
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_schedule)
+
+    p = commands.add_parser('orders', help="πλάνο παραγγελιών ομαδοποιημένο σε επισκέψεις στο φαρμακείο")
+    p.add_argument('--days', type=int, default=90, help="ορίζοντας σε ημέρες (προεπιλογή: %(default)s)")
+    p.add_argument('--lead-time', type=int, default=2, help="ημέρες μέχρι την παραλαβή (προεπιλογή: %(default)s)")
+    p.add_argument('--safety', type=int, default=7, help="απόθεμα ασφαλείας σε ημέρες δόσεων (προεπιλογή: %(default)s)")
+    p.add_argument('--cover', type=int, default=30, help="ημέρες που καλύπτει κάθε παραγγελία (προεπιλογή: %(default)s)")
+    p.add_argument('--window', type=int, default=7,
+                   help="πόσες ημέρες νωρίτερα επιτρέπεται μια παραγγελία για να ομαδοποιηθεί (προεπιλογή: %(default)s)")
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_orders)
+
+    p = commands.add_parser('export', help="εξαγωγή σε JSON")
+    p.add_argument('file', nargs='?', default='-', help="αρχείο εξόδου (προεπιλογή: stdout)")
+    p.add_argument('--compact', action='store_true', help="χωρίς εσοχές")
+    p.set_defaults(func=cmd_export)
+
+    p = commands.add_parser('import', help="εισαγωγή από JSON (αντικαθιστά όλα τα φάρμακα)")
+    p.add_argument('file', help="αρχείο JSON ή - για stdin")
+    p.add_argument('--date', type=date.fromisoformat, default=date.today(),
+                   help="ημερομηνία απογραφής YYYY-MM-DD (προεπιλογή: σήμερα)")
+    p.set_defaults(func=cmd_import)
+
+    p = commands.add_parser('stock', help="αποθέματα")
+    stock = p.add_subparsers(dest='stock_command', required=True)
+    s = stock.add_parser('list', help="αποθέματα και υπόλοιπα")
+    s.add_argument('--json', action='store_true')
+    s.set_defaults(func=cmd_stock_list)
+    s = stock.add_parser('set', help="ορισμός αποθέματος (και ημερομηνίας απογραφής σε σήμερα)")
+    s.add_argument('id', type=int)
+    s.add_argument('boxes', type=int)
+    s.add_argument('pieces', type=int)
+    s.set_defaults(func=cmd_stock_set)
+    s = stock.add_parser('restock', help="παραλαβή κουτιών/τεμαχίων")
+    s.add_argument('id', type=int)
+    s.add_argument('boxes', type=int)
+    s.add_argument('pieces', type=int, nargs='?', default=0)
+    s.add_argument('--date', type=date.fromisoformat, help="ημερομηνία παραλαβής (προεπιλογή: σήμερα)")
+    s.set_defaults(func=cmd_stock_restock)
+    s = stock.add_parser('consume', help="τεμάχια εκτός ημερήσιας δόσης (απώλεια, επιπλέον δόση)")
+    s.add_argument('id', type=int)
+    s.add_argument('pieces', type=int)
+    s.add_argument('--date', type=date.fromisoformat, help="ημερομηνία (προεπιλογή: σήμερα)")
+    s.set_defaults(func=cmd_stock_consume)
+    s = stock.add_parser('history', help="ιστορικό αποθέματος")
+    s.add_argument('id', type=int)
+    s.add_argument('--start', type=date.fromisoformat, default=date.min, help="από YYYY-MM-DD")
+    s.add_argument('--end', type=date.fromisoformat, default=date.max, help="έως YYYY-MM-DD")
+    s.add_argument('--json', action='store_true')
+    s.set_defaults(func=cmd_stock_history)
+
+    p = commands.add_parser('regimen', help="σχήματα λήψης (μέρα παρά μέρα, εβδομαδιαία, πρωί/βράδυ, σταδιακή μείωση)")
+    regimen = p.add_subparsers(dest='regimen_command', required=True)
+    s = regimen.add_parser('list', help="σχήματα ενός φαρμάκου")
+    s.add_argument('id', type=int)
+    s.set_defaults(func=cmd_regimen_list)
+    for name, func, text in (('set', cmd_regimen_set, "αντικατάσταση όλων των σχημάτων"),
+                             ('add', cmd_regimen_add, "προσθήκη σχήματος (π.χ. επόμενο βήμα μείωσης)")):
+        s = regimen.add_parser(name, help=text)
+        s.add_argument('id', type=int)
+        s.add_argument('regimen', help="π.χ. 2+1 (πρωί/βράδυ), 1/2 (μέρα παρά μέρα), 1/7@3 (εβδομαδιαία, 4η μέρα)")
+        s.add_argument('--start', type=date.fromisoformat, help="από YYYY-MM-DD (προεπιλογή: σήμερα)")
+        s.add_argument('--end', type=date.fromisoformat, help="έως (χωρίς) YYYY-MM-DD")
+        s.set_defaults(func=func)
+    s = regimen.add_parser('clear', help="επιστροφή στην ημερήσια δόση")
+    s.add_argument('id', type=int)
+    s.set_defaults(func=cmd_regimen_clear)
+
+    p = commands.add_parser('report', help="κατάταξη εξάντλησης για όλες τις βάσεις ενός φακέλου")
+    p.add_argument('directory', help="φάκελος με αρχεία <προφίλ>.db ή <προφίλ>/medications.db")
+    p.add_argument('--days', type=int, default=30, help="ορίζοντας προγράμματος (προεπιλογή: %(default)s)")
+    p.add_argument('--within', type=int, metavar='DAYS', help="μόνο όσα τελειώνουν μέσα σε DAYS ημέρες")
+    p.add_argument('--limit', type=int, help="το πολύ τόσες γραμμές")
+    p.add_argument('--jobs', type=int, help="παράλληλες διεργασίες (προεπιλογή: όσοι πυρήνες)")
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_report, needs_db=False)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    database.set_db_path(args.data_dir)
+    try:
+        if getattr(args, 'needs_db', True):
+            database.create_tables()
+        return args.func(args)
+    except BrokenPipeError:
+        # Output piped into e.g. `head`; silence the flush at interpreter exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+        print(f"farmasave: σφάλμα: {e}", file=sys.stderr)
+        return 1
+    finally:
+        database.close_connections()
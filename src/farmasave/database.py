@@ -1,22 +1,262 @@
+import contextvars
+import itertools
+import logging
 import sqlite3
-from datetime import datetime
+import threading
+from contextlib import contextmanager
+from dataclasses import replace
+from datetime import date, datetime
 
 import os
 from pathlib import Path
 
-# Use a default path for local development, will be overridden by the app
+from .models import Medication, StockEntry
+from . import regimens
+
+log = logging.getLogger(__name__)
+
+# Default database of the process, used when no use_database() block is
+# active; the app points it at its data directory with set_db_path()
 DB_NAME = 'medications.db'
 
+# Database selected by use_database() for the current thread / asyncio task
+_current_path = contextvars.ContextVar('farmasave_database', default=None)
+
+# Connection tuning. WAL lets background readers run while a write commits and
+# synchronous=NORMAL drops the fsync per commit (still safe in WAL mode).
+CACHE_SIZE_KB = 4096
+MMAP_SIZE = 32 * 1024 * 1024
+CACHED_STATEMENTS = 64
+
+# Query string of the read-only URIs made by readonly_uri()
+READONLY = '?mode=ro'
+
+# One long-lived connection per thread and database; the UI thread and any
+# background workers each keep their own instead of reconnecting on every call.
+# sqlite3 only lets a connection's own thread close it, so close_connections()
+# bumps the generation and every thread closes its stale connections itself.
+_local = threading.local()
+_connections_lock = threading.Lock()
+_generation = 0
+
+class UnknownMedicationError(KeyError):
+    """A write named a medication id that does not exist"""
+
+    def __init__(self, med_id):
+        super().__init__(med_id)
+        self.med_id = med_id
+
+    def __str__(self):
+        # KeyError would print just the repr of the id
+        return f"unknown medication id {self.med_id}"
+
+# Writes made through this module, per database path; see data_version()
+_write_counts = {}
+
 def set_db_path(data_path):
     global DB_NAME
     if data_path:
+        close_connections()
         DB_NAME = os.path.join(data_path, 'medications.db')
-        print(f"DEBUG: Database path set to: {DB_NAME}")
+        log.debug("Database path set to: %s", DB_NAME)
 
+def db_path():
+    """Path of the database the calls in this context operate on"""
+    return _current_path.get() or DB_NAME
 
-def create_tables():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+def readonly_uri(path):
+    """SQLite URI that opens the database file `path` read-only (never creating it)"""
+    return Path(path).resolve().as_uri() + READONLY
+
+@contextmanager
+def use_database(path, readonly=False):
+    """Direct every call in this block (this thread / task only) at the database file `path`.
+
+    Lets one process work with several databases, one per thread or one
+    after another, without touching the process default (set_db_path).
+    With readonly=True any write, migrations included, fails instead of
+    changing the file.
+    """
+    token = _current_path.set(readonly_uri(path) if readonly else os.fspath(path))
+    try:
+        yield
+    finally:
+        _current_path.reset(token)
+
+
+def _open_connection(path):
+    readonly = path.endswith(READONLY)
+    conn = sqlite3.connect(path, uri=readonly, cached_statements=CACHED_STATEMENTS)
+    if not readonly:
+        # Switching the journal mode is a write
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+def get_connection():
+    """Return this thread's persistent connection to the current database"""
+    path = db_path()
+    if getattr(_local, 'generation', None) != _generation:
+        close_thread_connections()
+        _local.generation = _generation
+    conn = _local.conns.get(path)
+    if conn is None:
+        conn = _local.conns[path] = _open_connection(path)
+    return conn
+
+def close_thread_connections():
+    """Close the calling thread's pooled connections (worker threads, before they stop)"""
+    for conn in getattr(_local, 'conns', {}).values():
+        conn.close()
+    _local.conns = {}
+
+def close_connections():
+    """Close the pooled connections (on exit or when the database moves).
+
+    The calling thread's connections are closed right away; other threads
+    close theirs on their next get_connection(), or through
+    close_thread_connections() (see DataWorker.shutdown).
+    """
+    global _generation
+    with _connections_lock:
+        _generation += 1
+    close_thread_connections()
+
+@contextmanager
+def transaction():
+    """Run a block of writes atomically and mark the data as changed"""
+    path = db_path()
+    conn = get_connection()
+    with conn:
+        yield conn
+        # Persistent counterpart of data_version(), see persistent_version()
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+    with _connections_lock:
+        _write_counts[path] = _write_counts.get(path, 0) + 1
+
+def data_version():
+    """Token that changes whenever the stored data may have changed.
+
+    Combines the database path, our own write counter for it and SQLite's
+    data_version, which moves when another connection (a worker thread or
+    another process) commits.
+    """
+    path = db_path()
+    conn = get_connection()
+    return (path, _write_counts.get(path, 0), conn.execute("PRAGMA data_version").fetchone()[0])
+
+def persistent_version():
+    """(schema version, revision) that survives restarts; changes with every write.
+
+    PRAGMA data_version is only meaningful within one connection, so every
+    transaction() also bumps a revision counter stored in the meta table.
+    """
+    conn = get_connection()
+    revision = conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+    return (schema_version(), revision)
+
+
+# Statements are module constants so every call reuses the same prepared
+# statement from the connection's cache.
+SQL_INSERT_MEDICATION = "INSERT INTO medications (name, type, pieces_per_box, current_boxes, current_pieces, inventory_date, inventory_day) VALUES (?, ?, ?, ?, ?, ?, ?)"
+SQL_INSERT_DOSAGE = "INSERT INTO dosages (med_id, dosage_per_day) VALUES (?, ?)"
+SQL_UPDATE_MEDICATION = "UPDATE medications SET name=?, type=?, pieces_per_box=?, current_boxes=?, current_pieces=?, inventory_date=?, inventory_day=? WHERE id=?"
+SQL_UPSERT_DOSAGE = """INSERT INTO dosages (med_id, dosage_per_day) VALUES (?, ?)
+        ON CONFLICT(med_id) DO UPDATE SET dosage_per_day = excluded.dosage_per_day"""
+SQL_DELETE_MEDICATION = "DELETE FROM medications WHERE id=?"
+SQL_DELETE_DOSAGES = "DELETE FROM dosages WHERE med_id=?"
+SQL_UPDATE_STOCK = "UPDATE medications SET current_boxes = ?, current_pieces = ?, inventory_date = ?, inventory_day = ? WHERE id = ?"
+_TOTAL = "(m.current_pieces + m.current_boxes * m.pieces_per_box)"
+_BALANCE = f"""(CASE WHEN m.inventory_day IS NULL THEN {_TOTAL}
+                ELSE MAX(0, {_TOTAL} - (:today - m.inventory_day) * COALESCE(d.dosage_per_day, 0)) END)"""
+# Live balance as of :today (a date ordinal) with days left and the ordinal
+# of the day the stock runs out, all computed by SQLite. The stored
+# depletion_day is kept current by triggers; a med that already ran out
+# reports today.
+SQL_BALANCES = f"""
+        SELECT m.id, m.name, m.type, m.pieces_per_box, m.current_boxes, m.current_pieces,
+               COALESCE(d.dosage_per_day, 0), m.inventory_day, {_TOTAL}, {_BALANCE},
+               CASE WHEN d.dosage_per_day > 0 THEN CAST({_BALANCE} AS REAL) / d.dosage_per_day END,
+               CASE WHEN d.dosage_per_day > 0 THEN MAX(:today, m.depletion_day) END
+        FROM medications m
+        LEFT JOIN dosages d ON m.id = d.med_id
+    """
+SQL_DEPLETING = SQL_BALANCES + """
+        WHERE m.depletion_day < :before
+        ORDER BY m.depletion_day
+    """
+# Append-only stock ledger. Every entry stores the balance and dosage right
+# after it, so each one is also a checkpoint: the balance on any day is the
+# latest entry up to that day minus the scheduled doses since, found with a
+# single seek on idx_stock_ledger_med_day. The medications row holds the
+# newest checkpoint, which keeps current balances O(1) in SQL_BALANCES.
+LEDGER_COUNT = 'count'        # stock recounted (add, edit, update_stock, import)
+LEDGER_RESTOCK = 'restock'    # pieces added
+LEDGER_CONSUME = 'consume'    # pieces taken beyond the daily dosage (lost, extra dose)
+LEDGER_REGIMEN = 'regimen'    # checkpoint taken when a medication's regimens change
+SQL_LEDGER_FROM_ROW = f"""
+        INSERT INTO stock_ledger (med_id, day, kind, quantity, balance, dosage)
+        SELECT m.id, m.inventory_day, :kind, COALESCE(:quantity, {_TOTAL}), {_TOTAL}, COALESCE(d.dosage_per_day, 0)
+        FROM medications m LEFT JOIN dosages d ON m.id = d.med_id
+        WHERE m.id = :med_id
+    """
+SQL_DELETE_LEDGER = "DELETE FROM stock_ledger WHERE med_id=?"
+SQL_CHECKPOINT_ROW = f"""
+        SELECT m.pieces_per_box, {_TOTAL}, m.inventory_day, COALESCE(d.dosage_per_day, 0)
+        FROM medications m LEFT JOIN dosages d ON m.id = d.med_id
+        WHERE m.id = ?
+    """
+# Balance as of :day from the latest entry on or before it (NULL before the first)
+_BALANCE_ON = """(SELECT MAX(0, l.balance - (:day - l.day) * l.dosage)
+                 FROM stock_ledger l WHERE l.med_id = m.id AND l.day <= :day
+                 ORDER BY l.day DESC, l.id DESC LIMIT 1)"""
+SQL_BALANCES_ON = f"SELECT m.id, m.name, {_BALANCE_ON} FROM medications m"
+SQL_BALANCE_ON = f"SELECT {_BALANCE_ON} FROM medications m WHERE m.id = :med_id"
+SQL_LEDGER = """
+        SELECT id, med_id, day, kind, quantity, balance, dosage FROM stock_ledger
+        WHERE med_id = :med_id AND day BETWEEN :start AND :end
+        ORDER BY day, id
+    """
+
+# Non-daily / multi-dose regimens (see regimens.py). Medications that have
+# any are few, so their balances and depletion days are computed in Python
+# and depletion_day is stored for them, keeping the depletion index valid.
+SQL_REGIMENS = "SELECT id, med_id, start_day, end_day, period, dose_days, slots FROM regimens ORDER BY med_id, start_day, id"
+SQL_REGIMENS_OF = "SELECT id, med_id, start_day, end_day, period, dose_days, slots FROM regimens WHERE med_id = ? ORDER BY start_day, id"
+SQL_INSERT_REGIMEN = "INSERT INTO regimens (med_id, start_day, end_day, period, dose_days, slots) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_CURRENT_REGIMENS_OF = """
+        SELECT id, med_id, start_day, end_day, period, dose_days, slots FROM regimens
+        WHERE med_id = ? AND (end_day IS NULL OR end_day > ?) ORDER BY start_day, id
+    """
+SQL_DELETE_REGIMENS = "DELETE FROM regimens WHERE med_id=?"
+# Replacing regimens on :day keeps their history: the ones in effect end on
+# :day and only those that had not started yet are dropped
+SQL_CLOSE_REGIMENS = """
+        UPDATE regimens SET end_day = :day
+        WHERE med_id = :med_id AND start_day < :day AND (end_day IS NULL OR end_day > :day)
+    """
+SQL_DELETE_REGIMENS_FROM = "DELETE FROM regimens WHERE med_id = :med_id AND start_day >= :day"
+SQL_SET_DEPLETION = "UPDATE medications SET depletion_day = ? WHERE id = ?"
+SQL_LATEST_ENTRY = """
+        SELECT day, balance, dosage FROM stock_ledger WHERE med_id = ? AND day <= ?
+        ORDER BY day DESC, id DESC LIMIT 1
+    """
+SQL_ENTRIES_BETWEEN = """
+        SELECT day, balance, dosage FROM stock_ledger WHERE med_id = ? AND day > ? AND day <= ?
+        ORDER BY day, id
+    """
+
+SQL_EXPORT = """
+        SELECT m.id, m.name, m.type, m.pieces_per_box, m.current_boxes, m.current_pieces, d.dosage_per_day
+        FROM medications m
+        LEFT JOIN dosages d ON m.id = d.med_id
+    """
+
+
+def _migrate_base_schema(c):
     c.execute('''CREATE TABLE IF NOT EXISTS medications (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT NOT NULL,
@@ -26,8 +266,8 @@ def create_tables():
         current_pieces INTEGER NOT NULL DEFAULT 0,
         inventory_date TEXT
     )''')
-    
-    # Check if inventory_date column exists (for existing databases)
+
+    # Check if inventory_date column exists (for databases older than the column)
     c.execute("PRAGMA table_info(medications)")
     columns = [col[1] for col in c.fetchall()]
     if 'inventory_date' not in columns:
@@ -39,101 +279,470 @@ def create_tables():
         dosage_per_day INTEGER NOT NULL,
         FOREIGN KEY (med_id) REFERENCES medications(id)
     )''')
-    conn.commit()
-    conn.close()
+
+def _migrate_unique_dosage(c):
+    # One dosage per medication, then let the index serve the joins, the
+    # per-med deletes and the UPSERT in update_medication. Several rows were
+    # how separate intakes were recorded (2 in the morning, 1 at night), so
+    # their sum goes into the newest row before the others are dropped.
+    c.execute("""UPDATE dosages SET dosage_per_day = (
+                     SELECT SUM(d.dosage_per_day) FROM dosages d WHERE d.med_id = dosages.med_id)
+                 WHERE id IN (SELECT MAX(id) FROM dosages GROUP BY med_id HAVING COUNT(*) > 1)""")
+    c.execute("DELETE FROM dosages WHERE id NOT IN (SELECT MAX(id) FROM dosages GROUP BY med_id)")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_dosages_med_id ON dosages(med_id)")
+
+def _migrate_inventory_day(c):
+    # Inventory dates as date ordinals (date.toordinal()), so balances can be
+    # computed in SQL; julianday('0001-01-01') is ordinal 1 + 1721424.5
+    c.execute("ALTER TABLE medications ADD COLUMN inventory_day INTEGER")
+    c.execute("UPDATE medications SET inventory_day = CAST(julianday(inventory_date) - 1721424.5 AS INTEGER) WHERE inventory_date IS NOT NULL")
+
+_DEPLETION_DAY = f"""(
+    SELECT CASE WHEN d.dosage_per_day > 0 AND m.inventory_day IS NOT NULL
+                THEN m.inventory_day + CAST({_TOTAL} / d.dosage_per_day AS INTEGER) END
+    FROM medications m LEFT JOIN dosages d ON m.id = d.med_id
+    WHERE m.id = {{med_id}})"""
+
+def _migrate_depletion_day(c):
+    # depletion_day = inventory_day + floor(total / dosage) does not depend on
+    # today, so it can be stored and indexed. Rows from before inventory dates
+    # existed never consumed anything; start counting them from today.
+    inv_date, inv_day = inventory_stamp()
+    c.execute("UPDATE medications SET inventory_date = ?, inventory_day = ? WHERE inventory_day IS NULL",
+              (inv_date, inv_day))
+    c.execute("ALTER TABLE medications ADD COLUMN depletion_day INTEGER")
+    c.execute(f"UPDATE medications SET depletion_day = {_DEPLETION_DAY.format(med_id='medications.id')}")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_medications_depletion_day ON medications(depletion_day)")
+
+    refresh = "UPDATE medications SET depletion_day = {depletion} WHERE id = {med_id};"
+    triggers = {
+        'trg_medications_insert': ("AFTER INSERT ON medications", ["NEW.id"]),
+        'trg_medications_update': ("AFTER UPDATE OF current_boxes, current_pieces, pieces_per_box, inventory_day ON medications", ["NEW.id"]),
+        'trg_dosages_insert': ("AFTER INSERT ON dosages", ["NEW.med_id"]),
+        'trg_dosages_update': ("AFTER UPDATE OF med_id, dosage_per_day ON dosages", ["OLD.med_id", "NEW.med_id"]),
+        'trg_dosages_delete': ("AFTER DELETE ON dosages", ["OLD.med_id"]),
+    }
+    for name, (event, med_ids) in triggers.items():
+        body = " ".join(refresh.format(depletion=_DEPLETION_DAY.format(med_id=med_id), med_id=med_id) for med_id in med_ids)
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+
+def _migrate_revision(c):
+    c.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    c.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0)")
+
+def _migrate_stock_ledger(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS stock_ledger (
+        id INTEGER PRIMARY KEY,
+        med_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        balance INTEGER NOT NULL,
+        dosage INTEGER NOT NULL
+    )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_stock_ledger_med_day ON stock_ledger(med_id, day)")
+    # Every existing stock figure becomes the first checkpoint of its medication
+    c.execute(f"""INSERT INTO stock_ledger (med_id, day, kind, quantity, balance, dosage)
+                  SELECT m.id, m.inventory_day, '{LEDGER_COUNT}', {_TOTAL}, {_TOTAL}, COALESCE(d.dosage_per_day, 0)
+                  FROM medications m LEFT JOIN dosages d ON m.id = d.med_id""")
+
+def _migrate_regimens(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS regimens (
+        id INTEGER PRIMARY KEY,
+        med_id INTEGER NOT NULL,
+        start_day INTEGER NOT NULL,
+        end_day INTEGER,
+        period INTEGER NOT NULL DEFAULT 1,
+        dose_days TEXT NOT NULL DEFAULT '0',
+        slots TEXT NOT NULL DEFAULT '1'
+    )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_regimens_med_id ON regimens(med_id, start_day)")
+
+# Schema steps in order; PRAGMA user_version records how many have been applied
+MIGRATIONS = [
+    _migrate_base_schema,
+    _migrate_unique_dosage,
+    _migrate_inventory_day,
+    _migrate_depletion_day,
+    _migrate_revision,
+    _migrate_stock_ledger,
+    _migrate_regimens,
+]
+
+# Upper bound for depletion-day range queries (date.max.toordinal())
+MAX_DAY = 3652059
+
+def schema_version():
+    return get_connection().execute("PRAGMA user_version").fetchone()[0]
+
+def is_database(path):
+    """Whether the file `path` is a medications database, checked read-only"""
+    try:
+        conn = sqlite3.connect(readonly_uri(path), uri=True)
+    except sqlite3.Error:
+        return False
+    try:
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'medications'").fetchone() is not None
+    except sqlite3.Error:
+        # Not an SQLite file at all
+        return False
+    finally:
+        conn.close()
+
+def create_tables():
+    """Bring the schema up to date; a single PRAGMA read when it already is"""
+    if schema_version() >= len(MIGRATIONS):
+        return
+
+    conn = get_connection()
+    with conn:
+        # DDL doesn't open a transaction implicitly; take the write lock up
+        # front so a concurrent process can't run the same steps
+        conn.execute("BEGIN IMMEDIATE")
+        version = schema_version()
+        c = conn.cursor()
+        for number, migrate in enumerate(MIGRATIONS[version:], start=version + 1):
+            migrate(c)
+            c.execute(f"PRAGMA user_version = {number}")
+
+def inventory_stamp(value=None):
+    """Return (ISO text, day ordinal) for an inventory date, today by default"""
+    if value is None:
+        value = date.today()
+    elif isinstance(value, str):
+        value = date.fromisoformat(value)
+    elif isinstance(value, datetime):
+        value = value.date()
+    return value.isoformat(), value.toordinal()
 
 def add_medication(name, med_type, pieces_per_box, current_boxes=0, current_pieces=0, dosage=0):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    inv_date = datetime.now().strftime("%Y-%m-%d")
-    c.execute("INSERT INTO medications (name, type, pieces_per_box, current_boxes, current_pieces, inventory_date) VALUES (?, ?, ?, ?, ?, ?)",
-              (name, med_type, pieces_per_box, current_boxes, current_pieces, inv_date))
-    med_id = c.lastrowid
-    c.execute("INSERT INTO dosages (med_id, dosage_per_day) VALUES (?, ?)", (med_id, dosage))
-    conn.commit()
-    conn.close()
+    inv_date, inv_day = inventory_stamp()
+    with transaction() as conn:
+        c = conn.execute(SQL_INSERT_MEDICATION,
+                         (name, med_type, pieces_per_box, current_boxes, current_pieces, inv_date, inv_day))
+        med_id = c.lastrowid
+        conn.execute(SQL_INSERT_DOSAGE, (med_id, dosage))
+        _log_count(conn, med_id)
     return med_id
 
-def get_all_medications():
-    conn = sqlite3.connect(DB_NAME)
+def _log_count(conn, med_id):
+    """Append a recount entry mirroring the medication's (just written) row"""
+    conn.execute(SQL_LEDGER_FROM_ROW, {'kind': LEDGER_COUNT, 'quantity': None, 'med_id': med_id})
+    _store_regimen_depletion(conn, med_id)
+
+def _regimens_of(conn, med_id):
     c = conn.cursor()
-    c.execute("""
-        SELECT m.id, m.name, m.type, m.pieces_per_box, m.current_boxes, m.current_pieces, d.dosage_per_day, m.inventory_date
-        FROM medications m
-        LEFT JOIN dosages d ON m.id = d.med_id
-    """)
-    meds = c.fetchall()
-    conn.close()
-    return meds
+    c.row_factory = regimens.Regimen.from_row
+    return c.execute(SQL_REGIMENS_OF, (med_id,)).fetchall()
+
+def _store_regimen_depletion(conn, med_id):
+    """Overwrite the trigger-computed depletion_day of a medication with regimens"""
+    regs = _regimens_of(conn, med_id)
+    if not regs:
+        return
+    _, total, last_day, dosage = conn.execute(SQL_CHECKPOINT_ROW, (med_id,)).fetchone()
+    conn.execute(SQL_SET_DEPLETION,
+                 (regimens.depletion_day(regimens.with_daily(regs, dosage), total, last_day), med_id))
+
+def get_all_medications(today=None):
+    """All medications as models.Medication rows, balances as of `today` (a date ordinal)"""
+    return query_balances(today if today is not None else date.today().toordinal())
 
 def update_medication(med_id, name, med_type, pieces_per_box, current_boxes, current_pieces, dosage=0):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    inv_date = datetime.now().strftime("%Y-%m-%d")
-    c.execute("UPDATE medications SET name=?, type=?, pieces_per_box=?, current_boxes=?, current_pieces=?, inventory_date=? WHERE id=?",
-              (name, med_type, pieces_per_box, current_boxes, current_pieces, inv_date, med_id))
-    
-    c.execute("SELECT id FROM dosages WHERE med_id = ?", (med_id,))
-    if c.fetchone():
-        c.execute("UPDATE dosages SET dosage_per_day = ? WHERE med_id = ?", (dosage, med_id))
-    else:
-        c.execute("INSERT INTO dosages (med_id, dosage_per_day) VALUES (?, ?)", (med_id, dosage))
-    
-    conn.commit()
-    conn.close()
+    inv_date, inv_day = inventory_stamp()
+    with transaction() as conn:
+        updated = conn.execute(SQL_UPDATE_MEDICATION,
+                               (name, med_type, pieces_per_box, current_boxes, current_pieces, inv_date, inv_day, med_id))
+        if updated.rowcount == 0:
+            raise UnknownMedicationError(med_id)
+        conn.execute(SQL_UPSERT_DOSAGE, (med_id, dosage))
+        _log_count(conn, med_id)
 
 def delete_medication(med_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DELETE FROM medications WHERE id=?", (med_id,))
-    c.execute("DELETE FROM dosages WHERE med_id=?", (med_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(SQL_DELETE_MEDICATION, (med_id,))
+        conn.execute(SQL_DELETE_DOSAGES, (med_id,))
+        conn.execute(SQL_DELETE_LEDGER, (med_id,))
+        conn.execute(SQL_DELETE_REGIMENS, (med_id,))
 
 def update_stock(med_id, boxes, pieces):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    inv_date = datetime.now().strftime("%Y-%m-%d")
-    c.execute("UPDATE medications SET current_boxes = ?, current_pieces = ?, inventory_date = ? WHERE id = ?", (boxes, pieces, inv_date, med_id))
-    conn.commit()
-    conn.close()
+    inv_date, inv_day = inventory_stamp()
+    with transaction() as conn:
+        if conn.execute(SQL_UPDATE_STOCK, (boxes, pieces, inv_date, inv_day, med_id)).rowcount == 0:
+            raise UnknownMedicationError(med_id)
+        _log_count(conn, med_id)
+
+def _checkpoint(conn, med_id, kind, delta, day_text, day):
+    """Write the balance on `day` plus `delta` as the medication's newest checkpoint"""
+    row = conn.execute(SQL_CHECKPOINT_ROW, (med_id,)).fetchone()
+    if row is None:
+        raise UnknownMedicationError(med_id)
+    pieces_per_box, total, last_day, dosage = row
+    # Entries are appended in day order, so each one stays the latest
+    # checkpoint until the next
+    if day < last_day:
+        raise ValueError(f"{day_text} is before the last stock entry of medication {med_id}")
+    if day > date.today().toordinal():
+        raise ValueError(f"{day_text} is in the future")
+    regs = _regimens_of(conn, med_id)
+    if regs:
+        used = regimens.consumption(regimens.with_daily(regs, dosage), last_day, day)
+    else:
+        used = (day - last_day) * dosage
+    balance = max(0, max(0, total - used) + delta)
+    new_boxes, new_pieces = divmod(balance, pieces_per_box) if pieces_per_box > 0 else (0, balance)
+    conn.execute(SQL_UPDATE_STOCK, (new_boxes, new_pieces, day_text, day, med_id))
+    conn.execute(SQL_LEDGER_FROM_ROW, {'kind': kind, 'quantity': abs(delta), 'med_id': med_id})
+    _store_regimen_depletion(conn, med_id)
+    return balance
+
+def _adjust_stock(med_id, kind, boxes, pieces, when):
+    day_text, day = inventory_stamp(when)
+    with transaction() as conn:
+        row = conn.execute(SQL_CHECKPOINT_ROW, (med_id,)).fetchone()
+        if row is None:
+            raise UnknownMedicationError(med_id)
+        return _checkpoint(conn, med_id, kind, boxes * row[0] + pieces, day_text, day)
+
+def restock(med_id, boxes=0, pieces=0, when=None):
+    """Record boxes/pieces received on `when` (today by default); returns the new balance"""
+    return _adjust_stock(med_id, LEDGER_RESTOCK, boxes, pieces, when)
+
+def consume(med_id, pieces, when=None):
+    """Record pieces used beyond the daily dosage on `when`; returns the new balance"""
+    return _adjust_stock(med_id, LEDGER_CONSUME, 0, -pieces, when)
+
+def get_regimens(med_id, day=None):
+    """The regimens of one medication (regimens.Regimen), by start day.
+
+    All of them, finished ones included, or only those still in effect on
+    or after `day` (a date ordinal).
+    """
+    if day is None:
+        return _regimens_of(get_connection(), med_id)
+    c = get_connection().cursor()
+    c.row_factory = regimens.Regimen.from_row
+    return c.execute(SQL_CURRENT_REGIMENS_OF, (med_id, day)).fetchall()
+
+def query_regimens():
+    """{med_id: [regimens.Regimen, ...]} for every medication that has regimens"""
+    c = get_connection().cursor()
+    c.row_factory = regimens.Regimen.from_row
+    grouped = {}
+    for regimen in c.execute(SQL_REGIMENS):
+        grouped.setdefault(regimen.med_id, []).append(regimen)
+    return grouped
+
+def set_regimens(med_id, new_regimens, when=None):
+    """Replace the regimens of a medication from `when` (today) on.
+
+    An empty list goes back to the daily dosage. The balance is checkpointed
+    on that day under the old regimens first; they are then ended on it
+    rather than deleted and no new regimen may start before it, so balances
+    of earlier days are never recomputed with the new ones.
+    """
+    day_text, day = inventory_stamp(when)
+    with transaction() as conn:
+        _checkpoint(conn, med_id, LEDGER_REGIMEN, 0, day_text, day)
+        conn.execute(SQL_CLOSE_REGIMENS, {'med_id': med_id, 'day': day})
+        conn.execute(SQL_DELETE_REGIMENS_FROM, {'med_id': med_id, 'day': day})
+        new_regimens = [regimen for regimen in new_regimens if regimen.last_day > day]
+        conn.executemany(SQL_INSERT_REGIMEN, [_regimen_params(med_id, regimen, day) for regimen in new_regimens])
+        if new_regimens:
+            _store_regimen_depletion(conn, med_id)
+        else:
+            conn.execute(f"UPDATE medications SET depletion_day = {_DEPLETION_DAY.format(med_id='?')} WHERE id = ?",
+                         (med_id, med_id))
+
+def _regimen_params(med_id, regimen, first_day):
+    regimen = regimen.starting_from(first_day)
+    return (med_id, regimen.start_day, regimen.end_day, regimen.period,
+            ",".join(map(str, regimen.dose_days)), ",".join(map(str, regimen.slots)))
+
+def _apply_regimens(rows, today):
+    """Replace the SQL daily-dosage figures of medications that have regimens"""
+    grouped = query_regimens()
+    if not grouped:
+        return rows
+    patched = []
+    for med in rows:
+        regs = grouped.get(med.id)
+        if regs is not None:
+            regs = regimens.with_daily(regs, med.dosage)
+            balance = max(0, med.total_pieces - regimens.consumption(regs, med.inventory_day, today))
+            depletion = regimens.depletion_day(regs, med.total_pieces, med.inventory_day)
+            if depletion is not None:
+                depletion = max(today, depletion)
+            med = replace(med, balance=balance, depletion_day=depletion,
+                          days_left=float(depletion - today) if depletion is not None else None)
+        patched.append(med)
+    return patched
+
+def _medications(sql, params):
+    c = get_connection().cursor()
+    c.row_factory = Medication.from_row
+    return c.execute(sql, params).fetchall()
+
+def query_balances(today):
+    """Live balances of all medications as of `today` (a date ordinal), computed in SQL.
+
+    Returns models.Medication rows; days_left and depletion_day are None
+    for medications without a dosage.
+    """
+    return _apply_regimens(_medications(SQL_BALANCES, {'today': today}), today)
+
+def query_depleting(today, within_days=None, limit=None):
+    """Medications with a dosage, soonest to run out first, as models.Medication rows.
+
+    Served by the index on the trigger-maintained depletion_day, so
+    `within_days` (only those running out before today + within_days) and
+    `limit` are range scans rather than a full sort.
+    """
+    sql = SQL_DEPLETING if limit is None else SQL_DEPLETING + " LIMIT :limit"
+    before = today + within_days if within_days is not None else MAX_DAY
+    return _apply_regimens(_medications(sql, {'today': today, 'before': before, 'limit': limit}), today)
+
+def query_balances_on(day):
+    """[(id, name, balance)] of every medication on `day` (a date ordinal).
+
+    Past days come from the stock ledger without replaying it; None for a
+    medication that had no stock entry yet. Future days are projections.
+    """
+    rows = get_connection().execute(SQL_BALANCES_ON, {'day': day}).fetchall()
+    grouped = query_regimens()
+    if not grouped:
+        return rows
+    return [(med_id, name, _regimen_balance_on(med_id, grouped[med_id], day) if med_id in grouped else balance)
+            for med_id, name, balance in rows]
+
+def query_balance_on(med_id, day):
+    regs = get_regimens(med_id)
+    if regs:
+        return _regimen_balance_on(med_id, regs, day)
+    row = get_connection().execute(SQL_BALANCE_ON, {'med_id': med_id, 'day': day}).fetchone()
+    return row[0] if row else None
+
+def _regimen_balance_on(med_id, regs, day):
+    # Same seek as _BALANCE_ON, with the regimens' consumption since the entry
+    entry = get_connection().execute(SQL_LATEST_ENTRY, (med_id, day)).fetchone()
+    if entry is None:
+        return None
+    entry_day, balance, dosage = entry
+    return max(0, balance - regimens.consumption(regimens.with_daily(regs, dosage), entry_day, day))
+
+def query_checkpoints(med_id, start_day, end_day):
+    """[(day, balance, dosage)] in effect from `start_day` to `end_day`, oldest first.
+
+    The latest entry on or before start_day (if any) followed by every later
+    entry up to end_day: two index range scans, whatever the ledger's length.
+    """
+    conn = get_connection()
+    entries = conn.execute(SQL_LATEST_ENTRY, (med_id, start_day)).fetchall()
+    entries += conn.execute(SQL_ENTRIES_BETWEEN, (med_id, start_day, end_day)).fetchall()
+    return entries
+
+def query_ledger(med_id, start_day=1, end_day=MAX_DAY):
+    """Stock ledger entries of one medication between two day ordinals, oldest first"""
+    c = get_connection().cursor()
+    c.row_factory = StockEntry.from_row
+    return c.execute(SQL_LEDGER, {'med_id': med_id, 'start': start_day, 'end': end_day}).fetchall()
+
+EXPORT_FIELDS = ('name', 'type', 'pieces_per_box', 'current_boxes', 'current_pieces', 'dosage_per_day')
+
+def _export_row(cursor, row):
+    return dict(zip(EXPORT_FIELDS, row[1:]))
+
+def regimen_to_json(regimen):
+    return {
+        'start': date.fromordinal(regimen.start_day).isoformat(),
+        'end': date.fromordinal(regimen.end_day).isoformat() if regimen.end_day is not None else None,
+        'period': regimen.period,
+        'days': list(regimen.dose_days),
+        'slots': list(regimen.slots),
+    }
+
+def regimen_from_json(med_id, item):
+    end = item.get('end')
+    return regimens.Regimen(med_id, inventory_stamp(item['start'])[1], inventory_stamp(end)[1] if end else None,
+                            item.get('period', 1), tuple(item.get('days', (0,))), tuple(item.get('slots', (1,))))
+
+def iter_export_rows(batch_size=500):
+    """Yield export dicts straight from the cursor, one batch in memory at a time.
+
+    Medications with regimens get an extra 'regimens' list; other rows keep
+    the original six fields.
+    """
+    grouped = query_regimens()
+    c = get_connection().cursor()
+    c.execute(SQL_EXPORT)
+    while True:
+        rows = c.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            item = _export_row(c, row)
+            if row[0] in grouped:
+                item['regimens'] = [regimen_to_json(regimen) for regimen in grouped[row[0]]]
+            yield item
 
 def export_data():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("""
-        SELECT m.name, m.type, m.pieces_per_box, m.current_boxes, m.current_pieces, d.dosage_per_day
-        FROM medications m
-        LEFT JOIN dosages d ON m.id = d.med_id
-    """)
-    rows = c.fetchall()
-    conn.close()
-    
-    data = []
-    for row in rows:
-        data.append({
-            'name': row[0],
-            'type': row[1],
-            'pieces_per_box': row[2],
-            'current_boxes': row[3],
-            'current_pieces': row[4],
-            'dosage_per_day': row[5]
-        })
-    return data
-
-def import_data(data_list, inventory_date):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    # Clear existing data
-    c.execute("DELETE FROM medications")
-    c.execute("DELETE FROM dosages")
-    c.execute("DELETE FROM sqlite_sequence WHERE name IN ('medications', 'dosages')")
-    
-    for item in data_list:
-        c.execute("INSERT INTO medications (name, type, pieces_per_box, current_boxes, current_pieces, inventory_date) VALUES (?, ?, ?, ?, ?, ?)",
-                  (item['name'], item['type'], item['pieces_per_box'], item['current_boxes'], item['current_pieces'], inventory_date))
-        med_id = c.lastrowid
-        c.execute("INSERT INTO dosages (med_id, dosage_per_day) VALUES (?, ?)", (med_id, item['dosage_per_day']))
-    
-    conn.commit()
-    conn.close()
+    return list(iter_export_rows())
+
+# Rows staged per executemany() call during import (and per progress report)
+IMPORT_BATCH_SIZE = 500
+
+def import_data(data_list, inventory_date, progress=None):
+    """Replace all medications with `data_list` in a single transaction.
+
+    Rows are first staged in a temp table in batches, then copied into
+    medications and dosages set-wise, so the database write lock is only
+    held for the final copy. `progress(done, total)` is called after each
+    staged batch. Either every row is imported or nothing changes.
+    """
+    total = len(data_list)
+    inventory_date, inventory_day = inventory_stamp(inventory_date)
+    rows = ((item['name'], item['type'], item['pieces_per_box'], item['current_boxes'], item['current_pieces'], item['dosage_per_day'])
+            for item in data_list)
+    # Staged positions become the medication ids (see below)
+    imported_regimens = [(seq, regimen_from_json(seq, regimen))
+                         for seq, item in enumerate(data_list, start=1) for regimen in item.get('regimens') or ()]
+
+    with transaction() as conn:
+        c = conn.cursor()
+        c.execute("""CREATE TEMP TABLE IF NOT EXISTS import_stage (
+            seq INTEGER PRIMARY KEY,
+            name TEXT, type TEXT, pieces_per_box INTEGER,
+            current_boxes INTEGER, current_pieces INTEGER, dosage_per_day INTEGER
+        )""")
+        c.execute("DELETE FROM import_stage")
+
+        done = 0
+        while done < total:
+            batch = list(itertools.islice(rows, IMPORT_BATCH_SIZE))
+            c.executemany("INSERT INTO import_stage (name, type, pieces_per_box, current_boxes, current_pieces, dosage_per_day) VALUES (?, ?, ?, ?, ?, ?)",
+                          batch)
+            done += len(batch)
+            if progress:
+                progress(done, total)
+
+        # Clear existing data
+        c.execute("DELETE FROM medications")
+        c.execute("DELETE FROM dosages")
+        c.execute("DELETE FROM stock_ledger")
+        c.execute("DELETE FROM regimens")
+        c.execute("DELETE FROM sqlite_sequence WHERE name IN ('medications', 'dosages')")
+
+        # The sequence was reset, so staged positions become the medication ids
+        c.execute("""INSERT INTO medications (id, name, type, pieces_per_box, current_boxes, current_pieces, inventory_date, inventory_day)
+                     SELECT seq, name, type, pieces_per_box, current_boxes, current_pieces, ?, ? FROM import_stage ORDER BY seq""",
+                  (inventory_date, inventory_day))
+        c.execute("INSERT INTO dosages (med_id, dosage_per_day) SELECT seq, dosage_per_day FROM import_stage ORDER BY seq")
+        c.execute(f"""INSERT INTO stock_ledger (med_id, day, kind, quantity, balance, dosage)
+                      SELECT seq, ?, '{LEDGER_COUNT}', current_pieces + current_boxes * pieces_per_box,
+                             current_pieces + current_boxes * pieces_per_box, dosage_per_day
+                      FROM import_stage ORDER BY seq""", (inventory_day,))
+        c.executemany(SQL_INSERT_REGIMEN, [_regimen_params(med_id, regimen, inventory_day)
+                                           for med_id, regimen in imported_regimens if regimen.last_day > inventory_day])
+        for med_id in sorted({med_id for med_id, _ in imported_regimens}):
+            _store_regimen_depletion(conn, med_id)
+        c.execute("DELETE FROM import_stage")
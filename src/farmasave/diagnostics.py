@@ -0,0 +1,186 @@
+"""Opt-in timing of the hot paths (database, calculations, table refreshes).
+
+While disabled nothing is wrapped, so instrumented code runs untouched.
+enable() replaces the public functions of the instrumented modules (and the
+registered methods of classes) with timing wrappers; disable() puts the
+originals back. Module-level functions are looked up by name at call time,
+so calls from inside the same module and from other modules are all counted.
+
+    diagnostics.enable()
+    ...
+    diagnostics.dump(path)   # or diagnostics.report() for a text summary
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open
+BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+# Set FARMASAVE_PROFILE=1 to enable timing from startup
+ENV_VAR = 'FARMASAVE_PROFILE'
+
+
+class Stats:
+    """Call count, total/max latency and a bucketed histogram of one function"""
+
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, elapsed_ms):
+        self.count += 1
+        self.total += elapsed_ms
+        if elapsed_ms > self.max:
+            self.max = elapsed_ms
+        for i, bound in enumerate(BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def as_dict(self):
+        labels = [f"<={bound}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            'count': self.count,
+            'total_ms': round(self.total, 3),
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max, 3),
+            'histogram': {label: n for label, n in zip(labels, self.buckets) if n},
+        }
+
+
+_stats = {}
+_lock = threading.Lock()
+_enabled = False
+# (owner, attribute name, label) registered by instrument_module/instrument_methods
+_targets = []
+# (owner, attribute name, original) of the wrappers currently installed
+_installed = []
+
+
+def record(name, elapsed_ms):
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = Stats()
+        stats.add(elapsed_ms)
+
+
+def _wrap(func, name):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                record(name, (time.perf_counter() - start) * 1000)
+    else:
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, (time.perf_counter() - start) * 1000)
+    return timed
+
+
+def _public_functions(module):
+    for attr, value in vars(module).items():
+        # Generators (and @contextmanager functions) return before doing any
+        # work, so timing the call itself says nothing
+        if (not attr.startswith('_') and inspect.isfunction(value)
+                and value.__module__ == module.__name__
+                and not inspect.isgeneratorfunction(inspect.unwrap(value))):
+            yield attr
+
+
+def instrument_module(module, prefix=None):
+    """Time every public function of `module` while diagnostics are enabled"""
+    prefix = prefix or module.__name__.rsplit('.', 1)[-1]
+    for attr in _public_functions(module):
+        _targets.append((module, attr, f"{prefix}.{attr}"))
+    if _enabled:
+        _install()
+
+
+def instrument_methods(cls, predicate, prefix=None):
+    """Time the methods of `cls` whose name satisfies `predicate`"""
+    prefix = prefix or cls.__name__
+    for attr, value in list(vars(cls).items()):
+        if inspect.isfunction(value) and predicate(attr):
+            _targets.append((cls, attr, f"{prefix}.{attr}"))
+    if _enabled:
+        _install()
+
+
+def _install():
+    installed = {(id(owner), attr) for owner, attr, _ in _installed}
+    for owner, attr, name in _targets:
+        if (id(owner), attr) in installed:
+            continue
+        original = getattr(owner, attr) if inspect.ismodule(owner) else vars(owner)[attr]
+        setattr(owner, attr, _wrap(original, name))
+        _installed.append((owner, attr, original))
+
+
+def enable():
+    global _enabled
+    _enabled = True
+    _install()
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    while _installed:
+        owner, attr, original = _installed.pop()
+        setattr(owner, attr, original)
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable_from_environment():
+    if os.environ.get(ENV_VAR, '') not in ('', '0'):
+        enable()
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def snapshot():
+    """{name: stats dict} of everything recorded so far, sorted by name"""
+    with _lock:
+        return {name: _stats[name].as_dict() for name in sorted(_stats)}
+
+
+def report():
+    """Plain-text summary, slowest total first"""
+    data = snapshot()
+    if not data:
+        return "Δεν υπάρχουν μετρήσεις."
+    lines = []
+    for name, s in sorted(data.items(), key=lambda item: item[1]['total_ms'], reverse=True):
+        lines.append(f"{name}: {s['count']}× μέσος {s['mean_ms']:.2f} ms, μέγ. {s['max_ms']:.2f} ms")
+    return "\n".join(lines)
+
+
+def dump(path):
+    """Write snapshot() as JSON to `path`; returns the path"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'enabled': _enabled, 'buckets_ms': BUCKETS_MS, 'functions': snapshot()},
+                  f, ensure_ascii=False, indent=4)
+    return path
@@ -0,0 +1,143 @@
+import codecs
+import json
+
+# Bytes requested per read from files and Android streams
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+# Characters that can follow a complete scalar item
+_DELIMITERS = _WHITESPACE + ',]'
+
+
+def iter_file_chunks(f, chunk_size=CHUNK_SIZE):
+    """Yield raw byte chunks from a binary file object"""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_java_chunks(input_stream, chunk_size=CHUNK_SIZE):
+    """Yield byte chunks from a java.io.InputStream (Android content resolver).
+
+    Reads go through one reusable Java byte[] so each chunk costs a single
+    JNI call, instead of one call and one Python int per byte.
+    """
+    from java import jarray, jbyte
+
+    buffer = jarray(jbyte)(chunk_size)
+    view = memoryview(buffer)
+    while True:
+        count = input_stream.read(buffer)
+        if count == -1:
+            return
+        if count:
+            yield bytes(view[:count])
+
+
+def iter_json_array(chunks):
+    """Incrementally decode a top-level JSON array, yielding its items.
+
+    `chunks` is an iterable of UTF-8 encoded bytes. Only the item being
+    decoded is kept as text, so the whole document never has to be in
+    memory as one string.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    text = ""
+    pos = 0
+    state = 'start'  # start -> item -> separator -> ... -> end
+    chunks = iter(chunks)
+    final = False
+
+    while True:
+        # Drop consumed text so the buffer only holds the pending item
+        if pos:
+            text = text[pos:]
+            pos = 0
+
+        while pos < len(text):
+            if text[pos] in _WHITESPACE:
+                pos += 1
+            elif state == 'start':
+                if text[pos] != '[':
+                    raise ValueError("Expected a JSON array")
+                pos += 1
+                state = 'first'
+            elif state in ('first', 'item'):
+                if state == 'first' and text[pos] == ']':
+                    pos += 1
+                    state = 'end'
+                    continue
+                try:
+                    item, end = _decoder.raw_decode(text, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break  # Item continues in the next chunk
+                if (not final and not isinstance(item, (dict, list, str))
+                        and (end == len(text) or text[end] not in _DELIMITERS)):
+                    break  # A number may continue in the next chunk ('1.' + '5')
+                yield item
+                pos = end
+                state = 'separator'
+            elif state == 'separator':
+                if text[pos] == ',':
+                    state = 'item'
+                elif text[pos] == ']':
+                    state = 'end'
+                else:
+                    raise ValueError(f"Unexpected {text[pos]!r} in JSON array")
+                pos += 1
+            else:
+                raise ValueError("Extra data after JSON array")
+
+        if final:
+            if state != 'end':
+                raise ValueError("Unexpected end of JSON array")
+            return
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            final = True
+            text += decoder.decode(b'', final=True)
+        else:
+            text += decoder.decode(chunk)
+
+
+def write_json_array(items, write, indent=4, chunk_size=CHUNK_SIZE):
+    """Serialize `items` as a JSON array, passing UTF-8 bytes to `write`.
+
+    The output matches json.dump(list(items), ensure_ascii=False,
+    indent=indent) but is produced item by item and flushed in pieces of
+    about `chunk_size` bytes, so memory use does not depend on the number of
+    items. `indent=None` writes the compact form. Returns the item count.
+    """
+    if indent is None:
+        open_, separator, close = '[', ',', ']'
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    else:
+        pad = ' ' * indent
+        open_, separator, close = '[\n' + pad, ',\n' + pad, '\n]'
+        encoder = json.JSONEncoder(ensure_ascii=False, indent=indent)
+
+    parts = []
+    size = 0
+    count = 0
+    for item in items:
+        text = encoder.encode(item)
+        if indent is not None:
+            text = text.replace('\n', '\n' + pad)
+        parts.append(separator if count else open_)
+        parts.append(text)
+        count += 1
+        size += len(text)
+        if size >= chunk_size:
+            write(''.join(parts).encode('utf-8'))
+            parts.clear()
+            size = 0
+
+    parts.append(close if count else '[]')
+    write(''.join(parts).encode('utf-8'))
+    return count
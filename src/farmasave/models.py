@@ -1,19 +1,59 @@
 from dataclasses import dataclass
+from datetime import date
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Medication:
+    """A medication with its live balance, built straight from a database row.
+
+    Field order matches database.SQL_BALANCES so `from_row` can be used as a
+    sqlite3 row factory; total_pieces, balance, days_left and depletion_day
+    are computed by SQLite and only stored here. Days are date ordinals.
+    """
     id: int
     name: str
     type: str
     pieces_per_box: int
     current_boxes: int
     current_pieces: int
+    dosage: int
+    inventory_day: int
+    total_pieces: int
+    balance: int
+    days_left: float = None
+    depletion_day: int = None
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
 
     @property
-    def total_pieces(self):
-        return self.current_pieces + (self.current_boxes * self.pieces_per_box)
+    def inventory_date(self):
+        return date.fromordinal(self.inventory_day) if self.inventory_day is not None else None
 
-@dataclass
+    @property
+    def depletion_date(self):
+        return date.fromordinal(self.depletion_day) if self.depletion_day is not None else None
+
+@dataclass(frozen=True, slots=True)
 class Dosage:
     med_id: int
     dosage_per_day: int
+
+@dataclass(frozen=True, slots=True)
+class StockEntry:
+    """One stock_ledger row: an event and the balance/dosage right after it"""
+    id: int
+    med_id: int
+    day: int
+    kind: str
+    quantity: int
+    balance: int
+    dosage: int
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+    @property
+    def entry_date(self):
+        return date.fromordinal(self.day)
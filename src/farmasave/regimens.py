@@ -0,0 +1,183 @@
+"""Calendar engine for periodic and multi-dose regimens.
+
+A regimen takes `slots` (the amounts of each intake, e.g. (2, 1) for two in
+the morning and one at night) on the days whose offset from `start_day`
+modulo `period` is in `dose_days`, until `end_day` (exclusive, None for
+open-ended). Every other day is period 2 with dose_days (0,); weekly is
+period 7. A medication may have several regimens, e.g. consecutive ones
+for tapering; their consumption adds up.
+
+Consumption over any range of days is O(1) per regimen: whole periods
+times the doses per period, plus a prefix count for the remainder.
+"""
+from dataclasses import dataclass, field
+
+# Largest day ordinal (date.max.toordinal()), the horizon of open-ended regimens
+MAX_DAY = 3652059
+
+
+@dataclass(frozen=True, slots=True)
+class Regimen:
+    med_id: int
+    start_day: int
+    end_day: int = None
+    period: int = 1
+    dose_days: tuple = (0,)
+    slots: tuple = (1,)
+    id: int = None
+    # prefix[k]: dosing days among offsets 0..k-1 of a period
+    prefix: tuple = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.period < 1:
+            raise ValueError("period must be at least one day")
+        if any(not 0 <= offset < self.period for offset in self.dose_days):
+            raise ValueError("dose days must lie within the period")
+        # Each offset counts once, whatever order or repeats it was given in
+        object.__setattr__(self, 'dose_days', tuple(sorted(set(self.dose_days))))
+        counts = [0] * (self.period + 1)
+        for k in range(self.period):
+            counts[k + 1] = counts[k] + (k in self.dose_days)
+        object.__setattr__(self, 'prefix', tuple(counts))
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        reg_id, med_id, start_day, end_day, period, dose_days, slots = row
+        return cls(med_id, start_day, end_day, period, _ints(dose_days), _ints(slots), reg_id)
+
+    @property
+    def per_dose_day(self):
+        """Pieces taken on each dosing day"""
+        return sum(self.slots)
+
+    @property
+    def last_day(self):
+        return MAX_DAY if self.end_day is None else self.end_day
+
+    def _count(self, offset):
+        # Dosing days among offsets [0, offset)
+        whole, rest = divmod(offset, self.period)
+        return whole * self.prefix[-1] + self.prefix[rest]
+
+    def dose_days_between(self, start, end):
+        """Number of dosing days in [start, end)"""
+        start = max(start, self.start_day)
+        end = min(end, self.last_day)
+        if end <= start:
+            return 0
+        return self._count(end - self.start_day) - self._count(start - self.start_day)
+
+    def consumption(self, start, end):
+        """Pieces consumed in [start, end)"""
+        return self.dose_days_between(start, end) * self.per_dose_day
+
+    def takes_on(self, day):
+        return self.start_day <= day < self.last_day and (day - self.start_day) % self.period in self.dose_days
+
+    def iter_dose_days(self, start, end):
+        """Yield the dosing days in [start, end), in order"""
+        start = max(start, self.start_day)
+        end = min(end, self.last_day)
+        if end <= start:
+            return
+        base = start - (start - self.start_day) % self.period
+        offsets = sorted(self.dose_days)
+        while base < end:
+            for offset in offsets:
+                day = base + offset
+                if day >= end:
+                    return
+                if day >= start:
+                    yield day
+            base += self.period
+
+    def starting_from(self, day):
+        """The same regimen restricted to [day, end), keeping its dosing days"""
+        if day <= self.start_day:
+            return self
+        shift = (day - self.start_day) % self.period
+        dose_days = tuple(sorted((offset - shift) % self.period for offset in self.dose_days))
+        return Regimen(self.med_id, day, self.end_day, self.period, dose_days, self.slots, self.id)
+
+    def describe(self):
+        """Short text form, e.g. '2+1', '1/2' (every other day) or '1/7@3'"""
+        text = "+".join(str(amount) for amount in self.slots)
+        if self.period > 1:
+            text += f"/{self.period}"
+            if tuple(self.dose_days) != (0,):
+                text += "@" + ",".join(str(offset) for offset in self.dose_days)
+        return text
+
+
+def _ints(text):
+    return tuple(int(part) for part in text.split(',') if part != '')
+
+
+def parse(text, med_id, start_day, end_day=None):
+    """Build a Regimen from its short text form (see Regimen.describe)"""
+    amounts, _, rest = text.strip().partition('/')
+    period, _, days = rest.partition('@')
+    try:
+        slots = tuple(int(part) for part in amounts.split('+'))
+        period = int(period) if period else 1
+        dose_days = tuple(int(part) for part in days.split(',')) if days else (0,)
+    except ValueError:
+        raise ValueError(f"invalid regimen {text!r}; expected e.g. 2+1, 1/2 or 1/7@3") from None
+    if any(amount < 0 for amount in slots):
+        raise ValueError(f"invalid regimen {text!r}; amounts cannot be negative")
+    return Regimen(med_id, start_day, end_day, period, dose_days, slots)
+
+
+def consumption(regimens, start, end):
+    """Pieces consumed by all `regimens` in [start, end)"""
+    return sum(regimen.consumption(start, end) for regimen in regimens)
+
+
+def depletion_day(regimens, balance, day):
+    """First day >= `day` whose doses no longer fit in `balance` (stock on `day`).
+
+    None if the regimens never use up the stock. Consumption is monotonic,
+    so this is an exponential then binary search over O(1) evaluations.
+    """
+    if not regimens:
+        return None
+    last = max(regimen.last_day for regimen in regimens)
+    if consumption(regimens, day, last) <= balance:
+        return None
+
+    # consumption(day, d + 1) > balance holds at d = last - 1; find the first such d
+    low, step = day, 1
+    high = min(day + step, last) - 1
+    while consumption(regimens, day, high + 1) <= balance:
+        low = high + 1
+        step *= 2
+        high = min(day + step, last) - 1
+    while low < high:
+        middle = (low + high) // 2
+        if consumption(regimens, day, middle + 1) > balance:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def with_daily(regimens, daily):
+    """`regimens` plus the plain `daily` dosage on every day none of them covers.
+
+    A medication keeps its daily dosage until its regimens begin (e.g. a
+    taper starting next week), between regimens and after the last one ends
+    (when they were cleared), so only days with a regimen in effect follow it.
+    """
+    regimens = sorted(regimens, key=lambda regimen: regimen.start_day)
+    if daily <= 0 or not regimens:
+        return regimens
+    med_id = regimens[0].med_id
+    gaps = []
+    covered = 1
+    for regimen in regimens:
+        if regimen.start_day > covered:
+            gaps.append(Regimen(med_id, covered, regimen.start_day, slots=(daily,)))
+        covered = max(covered, regimen.last_day)
+    if covered < MAX_DAY:
+        gaps.append(Regimen(med_id, covered, slots=(daily,)))
+    return sorted(gaps + regimens, key=lambda regimen: regimen.start_day)
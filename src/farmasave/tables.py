@@ -0,0 +1,86 @@
+from collections import namedtuple
+
+from toga.sources import Source
+
+
+def sync_rows(source, accessors, rows):
+    """Make a toga ListSource hold `rows` by touching only what changed.
+
+    Rows are keyed by their first column (the medication id). Rows that
+    disappeared are removed, new ones are inserted in place and existing ones
+    get their changed cells updated, so the native table keeps its scroll
+    position and only re-lays-out the affected rows.
+    """
+    wanted = {values[0] for values in rows}
+
+    # Remove from the end so earlier indexes stay valid
+    for index in reversed(range(len(source))):
+        if getattr(source[index], accessors[0]) not in wanted:
+            del source[index]
+
+    existing = {getattr(row, accessors[0]): row for row in source}
+    for index, values in enumerate(rows):
+        row = existing.get(values[0])
+        if row is None:
+            source.insert(index, values)
+            continue
+
+        if index >= len(source) or source[index] is not row:
+            # Moved (e.g. renamed and re-sorted); re-insert at its new position
+            source.remove(row)
+            source.insert(index, values)
+            continue
+
+        changes = {attr: value for attr, value in zip(accessors, values) if getattr(row, attr) != value}
+        if changes:
+            # Setting attributes one by one notifies once per cell (and the
+            # Android backend rebuilds the whole table per notification), so
+            # update silently and send a single change for the row.
+            row.__dict__.update(changes)
+            source.notify("change", item=row)
+
+
+class LazyListSource(Source):
+    """Read-only table source that builds rows only when the table asks for them.
+
+    `items` is any indexable sequence and `formatter` turns one item into the
+    tuple of cell values. At most `limit` rows are exposed; backends that
+    materialize every row (Android) stay bounded and `more()` widens the window.
+    """
+
+    def __init__(self, accessors, items, formatter, limit=None):
+        super().__init__()
+        self._row_type = namedtuple('LazyRow', accessors)
+        self._items = items
+        self._format = formatter
+        self._limit = limit
+        self._len = len(items) if limit is None else min(limit, len(items))
+        self._rows = {}
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError(index)
+        row = self._rows.get(index)
+        if row is None:
+            row = self._rows[index] = self._row_type(*self._format(self._items[index]))
+        return row
+
+    def index(self, row):
+        for index, cached in self._rows.items():
+            if cached is row:
+                return index
+        raise ValueError(f"{row!r} is not in the source")
+
+    @property
+    def truncated(self):
+        """True if some items are hidden beyond the current window"""
+        return self._len < len(self._items)
+
+    def more(self):
+        """Return a source over the same items with the window grown by one page"""
+        return LazyListSource(self._row_type._fields, self._items, self._format, self._len + self._limit)
@@ -0,0 +1,33 @@
+import json
+import os
+import tempfile
+
+# Last rendered table rows, shown at the next launch before the database is read
+FILE_NAME = 'view_cache.json'
+
+
+def load(data_dir):
+    """Return (key, views) saved by the last run, or (None, {}) if there are none"""
+    try:
+        with open(os.path.join(data_dir, FILE_NAME), 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return tuple(cache['key']), cache['views']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, {}
+
+
+def save(data_dir, key, views):
+    """Write the views atomically, so a killed app never leaves a torn file.
+
+    Each call writes its own temporary file, so overlapping saves cannot
+    interleave or rename each other's file away.
+    """
+    path = os.path.join(data_dir, FILE_NAME)
+    fd, tmp_path = tempfile.mkstemp(prefix=FILE_NAME + '.', suffix='.tmp', dir=data_dir)
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            json.dump({'key': list(key), 'views': views}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
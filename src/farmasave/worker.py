@@ -0,0 +1,66 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+
+from . import database
+
+# Seconds shutdown() waits for each pool's threads to close their connections
+SHUTDOWN_TIMEOUT = 5
+
+
+class DataWorker:
+    """Async facade that runs database and calculation calls off the UI loop.
+
+    Reads (queries, snapshots, schedules, exports) share a small thread pool.
+    Every write goes through a single writer thread, so commits are
+    serialized and never wait on each other's locks. Each thread keeps its
+    own pooled connection (see database.get_connection).
+    """
+
+    def __init__(self, loop=None, readers=2):
+        self._loop = loop
+        self._reader_count = readers
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='farmasave-read')
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='farmasave-write')
+
+    @property
+    def loop(self):
+        return self._loop or asyncio.get_running_loop()
+
+    async def read(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on a reader thread and await its result"""
+        return await self.loop.run_in_executor(self._readers, partial(func, *args, **kwargs))
+
+    async def write(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on the writer thread and await its result"""
+        return await self.loop.run_in_executor(self._writer, partial(func, *args, **kwargs))
+
+    def on_loop(self, callback):
+        """Wrap a UI callback (e.g. import progress) so worker threads can call it safely"""
+        loop = self.loop
+
+        def call(*args):
+            loop.call_soon_threadsafe(callback, *args)
+        return call
+
+    def shutdown(self):
+        """Close every worker thread's connections, then stop the pools.
+
+        A connection can only be closed by its own thread, so one close task
+        is run on each thread; the barrier keeps a thread from taking two.
+        Closing them lets SQLite checkpoint the WAL and remove -wal/-shm.
+        """
+        for pool, count in ((self._readers, self._reader_count), (self._writer, 1)):
+            barrier = threading.Barrier(count)
+            wait([pool.submit(_close_thread_connections, barrier) for _ in range(count)], timeout=SHUTDOWN_TIMEOUT)
+            pool.shutdown(wait=False)
+
+
+def _close_thread_connections(barrier):
+    database.close_thread_connections()
+    try:
+        barrier.wait(timeout=SHUTDOWN_TIMEOUT)
+    except threading.BrokenBarrierError:
+        # A thread was busy past the timeout; it closes its connections on next use
+        pass
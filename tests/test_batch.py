@@ -0,0 +1,48 @@
+import sqlite3
+
+import pytest
+
+from farmasave import batch, database
+
+
+@pytest.fixture
+def profiles(tmp_path):
+    with database.use_database(tmp_path / 'anna.db'):
+        database.create_tables()
+        database.add_medication("A", "Χάπι", 10, 1, 0, 1)
+    (tmp_path / 'nikos').mkdir()
+    with database.use_database(tmp_path / 'nikos' / 'medications.db'):
+        database.create_tables()
+    database.close_connections()
+
+    old = sqlite3.connect(tmp_path / 'old.db')
+    database._migrate_base_schema(old.cursor())
+    old.execute("PRAGMA user_version = 1")
+    old.commit()
+    old.close()
+    sqlite3.connect(tmp_path / 'other.db').execute("CREATE TABLE notes (text)").connection.close()
+    (tmp_path / 'notes.db').write_text("not a database")
+    return tmp_path
+
+
+def test_only_medication_databases_are_found(profiles):
+    assert batch.find_databases(profiles) == [('anna', str(profiles / 'anna.db')),
+                                              ('nikos', str(profiles / 'nikos' / 'medications.db')),
+                                              ('old', str(profiles / 'old.db'))]
+
+
+def test_old_schema_is_reported_not_migrated(profiles):
+    path = str(profiles / 'old.db')
+    summary = batch.summarize('old', path)
+    assert summary['error'] == f"schema version 1 is older than {len(database.MIGRATIONS)}; open it with farmasave to upgrade"
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 1
+    conn.close()
+
+
+def test_summary_is_read_only(profiles):
+    path = profiles / 'anna.db'
+    before = path.read_bytes()
+    summary = batch.summarize('anna', str(path))
+    assert [(name, days_left) for name, _, days_left, _ in summary['depletion']] == [("A", 10)]
+    assert path.read_bytes() == before
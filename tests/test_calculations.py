@@ -0,0 +1,107 @@
+import random
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pytest
+
+from farmasave import database, calculations, regimens
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    rnd = random.Random(0)
+    database.set_db_path(str(tmp_path))
+    database.create_tables()
+    database.import_data([{'name': f"Φάρμακο {i:03d}", 'type': "Χάπι", 'pieces_per_box': rnd.choice((10, 28, 30)),
+                           'current_boxes': rnd.randint(0, 4), 'current_pieces': rnd.randint(0, 9),
+                           'dosage_per_day': rnd.choice((0, 1, 2, 3))} for i in range(300)], date.today())
+    today = date.today().toordinal()
+    for med_id in rnd.sample(range(1, 301), 30):
+        database.set_regimens(med_id, [regimens.parse(rnd.choice(('2+1/2', '1/7@3', '1+1')), med_id, today + rnd.randint(0, 9))])
+    yield
+    calculations.set_backend(None)
+    database.close_connections()
+
+
+@pytest.fixture
+def db(tmp_path):
+    database.set_db_path(str(tmp_path))
+    database.create_tables()
+    calculations.clear_caches()
+    yield
+    database.close_connections()
+
+
+def _forecasts():
+    today = date.today()
+    return (calculations.get_depletion_info(), calculations.schedule_intervals(400), calculations.generate_schedule(90),
+            calculations.stock_curves(today, today + timedelta(days=365)),
+            calculations.stock_curves(today + timedelta(days=3), today + timedelta(days=800), step=30, offset=20, limit=50),
+            calculations.balances_on(today + timedelta(days=45)), calculations.plan_orders(365))
+
+
+def test_backends_give_identical_results(catalog):
+    pytest.importorskip('numpy')
+    calculations.set_backend('python')
+    expected = _forecasts()
+    calculations.set_backend('numpy')
+    assert _forecasts() == expected
+
+
+def _on_new_thread(fn):
+    # A worker thread with its own connection, like DataWorker's readers
+    def run():
+        try:
+            return fn()
+        finally:
+            database.close_thread_connections()
+    with ThreadPoolExecutor(1) as pool:
+        return pool.submit(run).result()
+
+
+def test_write_from_another_process_is_seen_by_every_thread(tmp_path):
+    database.set_db_path(str(tmp_path))
+    database.create_tables()
+    calculations.clear_caches()
+    try:
+        med_id = database.add_medication("A", "Χάπι", 10, 3, 0, 1)
+        assert _on_new_thread(calculations.get_depletion_info)[0][2:] == (30, 30)
+
+        subprocess.run([sys.executable, '-m', 'farmasave', '--data-dir', str(tmp_path), 'stock', 'set', str(med_id), '1', '0'],
+                       check=True, capture_output=True, env={'PYTHONPATH': calculations.__file__.rsplit('farmasave', 1)[0]})
+
+        assert _on_new_thread(calculations.get_depletion_info)[0][2:] == (10, 10)
+        assert calculations.get_depletion_info()[0][2:] == (10, 10)
+    finally:
+        database.close_connections()
+
+
+def test_numpy_is_not_imported_at_startup():
+    code = "import sys, farmasave.cli, farmasave.calculations; print('numpy' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            env={'PYTHONPATH': calculations.__file__.rsplit('farmasave', 1)[0]})
+    assert result.stdout.strip() == 'False'
+
+
+def test_plan_orders(db):
+    today = date.today()
+    late = database.add_medication("A", "Χάπι", 10, 0, 5, 1)
+    rounded = database.add_medication("B", "Χάπι", 28, 1, 12, 2)
+    grouped = database.add_medication("C", "Χάπι", 100, 0, 18, 1)
+    database.add_medication("D", "Χάπι", 30, 10, 0, 1)
+    database.add_medication("E", "Σιρόπι", 1, 0, 0, 0)
+
+    def day(offset):
+        return today + timedelta(days=offset)
+
+    # A runs out on day 5, too late for the lead time and safety stock, so it
+    # goes today; 3 boxes last until day 35 and it is needed again on day 28.
+    # C (needed on day 11) and B (day 13, 60 pieces = 3 boxes of 28) share
+    # the trip on day 9. D lasts past the horizon and E is not taken.
+    assert calculations.plan_orders(50) == [
+        (today, [(late, "A", 3, today)]),
+        (day(9), [(grouped, "C", 1, day(11)), (rounded, "B", 3, day(13))]),
+        (day(26), [(late, "A", 3, day(28))]),
+    ]
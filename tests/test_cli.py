@@ -0,0 +1,10 @@
+import pytest
+
+from farmasave import cli
+
+
+@pytest.mark.parametrize('command', [['stock', 'set', '99', '1', '1'], ['stock', 'restock', '99', '1'],
+                                     ['stock', 'consume', '99', '1'], ['regimen', 'set', '99', '2+1']])
+def test_unknown_medication_id(tmp_path, capsys, command):
+    assert cli.main(['--data-dir', str(tmp_path)] + command) == 1
+    assert capsys.readouterr().err == "farmasave: σφάλμα: unknown medication id 99\n"
@@ -0,0 +1,65 @@
+import json
+import random
+
+import pytest
+
+from farmasave import jsonstream
+
+ITEMS = [
+    {'name': "Depon 500mg", 'type': "Χάπι", 'pieces_per_box': 20, 'current_boxes': 2,
+     'current_pieces': 7, 'dosage_per_day': 3},
+    {'name': "Σιρόπι \"βήχα\"\n", 'type': "Σιρόπι", 'pieces_per_box': 1, 'current_boxes': 0,
+     'current_pieces': 0, 'dosage_per_day': 0, 'regimens': [{'start': "2026-01-31", 'end': None,
+                                                            'period': 7, 'days': [0, 3], 'slots': [2, 1]}]},
+    1.5, -12, 3e-7, 1E+21, 0, True, False, None, "", "€ 😀", [], {}, [[1, [2.25]], {'a': -0.5}],
+]
+
+
+def _chunks(data, rnd, max_size):
+    pos = 0
+    while pos < len(data):
+        size = rnd.randint(1, max_size)
+        yield data[pos:pos + size]
+        pos += size
+
+
+@pytest.mark.parametrize('indent', [None, 4])
+@pytest.mark.parametrize('seed', range(20))
+def test_round_trip_with_small_random_chunks(indent, seed):
+    rnd = random.Random(seed)
+    out = []
+    count = jsonstream.write_json_array(ITEMS, out.append, indent=indent, chunk_size=rnd.randint(1, 64))
+    data = b''.join(out)
+    assert count == len(ITEMS)
+    assert data == json.dumps(ITEMS, ensure_ascii=False, indent=indent,
+                              separators=(',', ':') if indent is None else None).encode('utf-8')
+    assert list(jsonstream.iter_json_array(_chunks(data, rnd, 5))) == ITEMS
+
+
+def test_every_split_point():
+    data = b'[1.5, -2e3,true ,"x", 10, [7.25], 0]'
+    expected = json.loads(data)
+    for split in range(1, len(data)):
+        assert list(jsonstream.iter_json_array([data[:split], data[split:]])) == expected
+
+
+@pytest.mark.parametrize('chunks', [[b'[1.', b'5]'], [b'[1', b'e3]'], [b'[1e', b'-3]'], [b'[-', b'1]'], [b'[12', b'34]']])
+def test_number_split_across_chunks(chunks):
+    assert list(jsonstream.iter_json_array(chunks)) == json.loads(b''.join(chunks))
+
+
+def test_number_at_end_of_input():
+    with pytest.raises(ValueError):
+        list(jsonstream.iter_json_array([b'[1', b'5']))
+
+
+@pytest.mark.parametrize('data', [b'{}', b'[1 2]', b'[1,]x', b'[1] 2', b'[1x]'])
+def test_invalid_input(data):
+    with pytest.raises(ValueError):
+        list(jsonstream.iter_json_array([data]))
+
+
+def test_empty_array():
+    out = []
+    assert jsonstream.write_json_array([], out.append) == 0
+    assert list(jsonstream.iter_json_array(out)) == []
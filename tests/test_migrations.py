@@ -0,0 +1,25 @@
+import sqlite3
+
+from farmasave import database
+
+
+def test_duplicate_dosages_are_summed(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'medications.db')
+    c = conn.cursor()
+    database._migrate_base_schema(c)
+    c.execute("PRAGMA user_version = 1")
+    c.execute("""INSERT INTO medications (name, type, pieces_per_box, current_boxes, current_pieces, inventory_date)
+                 VALUES ('A', 'Χάπι', 30, 2, 0, '2026-01-31'), ('B', 'Χάπι', 30, 1, 0, '2026-01-31')""")
+    # Morning and night intakes of A recorded as separate rows
+    c.executemany("INSERT INTO dosages (med_id, dosage_per_day) VALUES (?, ?)", [(1, 2), (1, 1), (2, 1)])
+    conn.commit()
+    conn.close()
+
+    database.set_db_path(str(tmp_path))
+    try:
+        database.create_tables()
+        assert {m.name: m.dosage for m in database.get_all_medications()} == {'A': 3, 'B': 1}
+        rows = database.get_connection().execute("SELECT COUNT(*) FROM dosages").fetchone()[0]
+        assert rows == 2
+    finally:
+        database.close_connections()
@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+
+import pytest
+
+from farmasave import database, calculations, regimens
+
+
+@pytest.fixture
+def db(tmp_path):
+    database.set_db_path(str(tmp_path))
+    database.create_tables()
+    calculations.clear_caches()
+    yield
+    database.close_connections()
+
+
+def _backdate(med_id, days):
+    # Pretend the medication was counted `days` ago
+    day = date.today().toordinal() - days
+    with database.transaction() as conn:
+        conn.execute("UPDATE medications SET inventory_day = ?, inventory_date = date(? + 1721424.5) WHERE id = ?",
+                     (day, day, med_id))
+        conn.execute("UPDATE stock_ledger SET day = ? WHERE med_id = ?", (day, med_id))
+
+
+def test_replacing_regimens_keeps_past_balances(db):
+    today = date.today()
+    med_id = database.add_medication("A", "Χάπι", 100, 1, 0, 1)
+    _backdate(med_id, 20)
+    start = today - timedelta(days=20)
+    database.set_regimens(med_id, [regimens.parse('1/7', med_id, start.toordinal())], start)
+    before = {when: calculations.balance_on(med_id, when) for when in (today - timedelta(days=10), today)}
+
+    database.set_regimens(med_id, [regimens.parse('3', med_id, today.toordinal())])
+
+    assert {when: calculations.balance_on(med_id, when) for when in before} == before
+    assert before[today - timedelta(days=10)] == 98
+    assert calculations.balance_on(med_id, today + timedelta(days=2)) == before[today] - 6
+    assert [regimen.describe() for regimen in database.get_regimens(med_id, today.toordinal())] == ['3']
+
+
+def test_clearing_regimens_goes_back_to_the_daily_dosage(db):
+    today = date.today()
+    med_id = database.add_medication("A", "Χάπι", 100, 1, 0, 2)
+    _backdate(med_id, 10)
+    start = today - timedelta(days=10)
+    database.set_regimens(med_id, [regimens.parse('1/2', med_id, start.toordinal())], start)
+    balance = calculations.balance_on(med_id, today)
+    assert balance == 95
+
+    database.set_regimens(med_id, [])
+
+    assert calculations.balance_on(med_id, today - timedelta(days=4)) == 97
+    assert calculations.balance_on(med_id, today + timedelta(days=5)) == balance - 10
+    assert calculations.balances_on(today + timedelta(days=5))[med_id] == balance - 10
+    assert dict(calculations.stock_curves(today - timedelta(days=4), today + timedelta(days=5), step=9)) == \
+        {med_id: calculations.stock_curve(med_id, today - timedelta(days=4), today + timedelta(days=5), step=9)}
+    assert calculations.stock_curve(med_id, today - timedelta(days=4), today + timedelta(days=5), step=9).tolist() == \
+        [97, balance - 10]
+
+
+def test_daily_dosage_fills_gaps_between_regimens():
+    taper = [regimens.Regimen(1, 10, 20, slots=(2,)), regimens.Regimen(1, 30, 40, slots=(1,))]
+    plan = regimens.with_daily(taper, 5)
+    assert [regimens.consumption(plan, day, day + 1) for day in (5, 15, 25, 35, 45)] == [5, 2, 5, 1, 5]
+
+
+def test_repeated_dose_days_count_once(db):
+    assert regimens.parse('1/7@3,0,0', 1, 100) == regimens.parse('1/7@0,3', 1, 100)
+    today = date.today()
+    database.import_data([{'name': "A", 'type': "Χάπι", 'pieces_per_box': 100, 'current_boxes': 1, 'current_pieces': 0,
+                           'dosage_per_day': 0, 'regimens': [{'start': today.isoformat(), 'end': None, 'period': 7,
+                                                              'days': [0, 0], 'slots': [1]}]}], today)
+    [regimen] = database.get_regimens(1)
+    assert regimen.dose_days == (0,)
+    assert list(regimen.iter_dose_days(today.toordinal(), today.toordinal() + 14)) == [today.toordinal(), today.toordinal() + 7]
+    assert calculations.balance_on(1, today + timedelta(days=14)) == 98
+    assert calculations.stock_curve(1, today, today + timedelta(days=14)).tolist()[-1] == 98